@@ -0,0 +1,143 @@
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from .loader import BACKENDS, LoadOptions, OSMLoader, is_backend_available
+from . import util
+from .table import StationTable
+
+
+def measure_time(func: Callable[[], Any], repeat: int = 5) -> float:
+    """Returns the best wall time (in seconds) out of `repeat` calls to func."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_peak_memory(func: Callable[[], Any]) -> int:
+    """Returns the peak amount of memory (in bytes) allocated while calling func."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """Returns the size (in bytes) of an object, including everything it references.
+    Objects referenced multiple times (e.g. interned strings) are only counted once."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(i, seen) for i in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, i), seen) for i in obj.__slots__ if hasattr(obj, i))
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def bench_station_memory(path: str) -> List[Tuple[str, float]]:
+    """Returns the memory used per station (in bytes) by different station representations."""
+    stations = OSMLoader.parse(path, options=LoadOptions(kinds={"stations"})).stations
+    compact_stations = OSMLoader.parse(
+        path,
+        options=LoadOptions(kinds={"stations"}, compact=True),
+    ).stations
+    table = StationTable.from_stations(stations)
+
+    return [
+        ("Station", (deep_sizeof(stations) - sys.getsizeof(stations)) / len(stations)),
+        ("CompactStation", (deep_sizeof(compact_stations) - sys.getsizeof(compact_stations))
+         / len(compact_stations)),
+        ("StationTable", deep_sizeof(table) / len(table)),
+    ]
+
+
+def random_positions(count: int, seed: int) -> List[Tuple[float, float]]:
+    """Generates random positions within the bounding box of Poland."""
+    rng = random.Random(seed)
+    return [(rng.uniform(49.0, 54.9), rng.uniform(14.1, 24.2)) for _ in range(count)]
+
+
+def bench_distances(pairs: int) -> List[Tuple[str, float]]:
+    """Returns the time (in seconds) needed to compute `pairs` distances with
+    different util functions."""
+    a = random_positions(pairs, 1)
+    b = random_positions(pairs, 2)
+    results = [("distance loop", measure_time(lambda: [util.distance(*i) for i in zip(a, b)], 1))]
+
+    # Threshold checks are benchmarked on nearby points, like platforms and their stations
+    rng = random.Random(3)
+    near = [(lat + rng.uniform(-0.002, 0.002), lon + rng.uniform(-0.003, 0.003))
+            for lat, lon in a]
+    results.append(("within 100 m", measure_time(
+        lambda: [util.is_within_distance(*i, 100.0) for i in zip(a, near)], 1)))
+    results.append(("within 100 m (fast)", measure_time(
+        lambda: [util.is_within_distance(*i, 100.0, fast=True) for i in zip(a, near)], 1)))
+
+    try:
+        util.USE_NUMPY = False
+        results.append(("distances (Python)", measure_time(lambda: util.distances(a, b), 1)))
+    finally:
+        util.USE_NUMPY = True
+
+    if util.get_numpy() is not None:
+        results.append(("distances (NumPy)", measure_time(lambda: util.distances(a, b), 1)))
+
+    return results
+
+
+def bench_parse(path: str, repeat: int) -> List[Tuple[str, float, int]]:
+    results: List[Tuple[str, float, int]] = []
+    reference = OSMLoader.parse(path, "sax")
+
+    for backend in filter(is_backend_available, BACKENDS):
+        def parse() -> OSMLoader:
+            return OSMLoader.parse(path, backend)
+
+        data = parse()
+        if data.stations != reference.stations or data.platforms != reference.platforms \
+                or data.ways != reference.ways:
+            raise AssertionError(f"{backend} backend produced different data than sax")
+
+        results.append((f"parse ({backend})", measure_time(parse, repeat),
+                        measure_peak_memory(parse)))
+
+    return results
+
+
+if __name__ == "__main__":
+    argument_parser = ArgumentParser()
+    argument_parser.add_argument("-f", "--file", default="plrailmap.osm")
+    argument_parser.add_argument("-r", "--repeat", type=int, default=5)
+    argument_parser.add_argument("-p", "--pairs", type=int, default=1_000_000,
+                                 help="number of position pairs for distance benchmarks")
+    args = argument_parser.parse_args()
+
+    for name, elapsed, peak in bench_parse(args.file, args.repeat):
+        print(f"{name:<24}{elapsed * 1000:>10.1f} ms{peak / 2**20:>10.2f} MiB peak")
+
+    for name, per_station in bench_station_memory(args.file):
+        print(f"{name:<24}{per_station:>10.0f} bytes per station")
+
+    for name, elapsed in bench_distances(args.pairs):
+        print(f"{name:<24}{elapsed * 1000:>10.1f} ms for {args.pairs} pairs")
@@ -0,0 +1,109 @@
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Union
+
+CACHE_FORMAT_VERSION = 2
+CACHE_DIR_NAME = ".cache"
+
+StrPath = Union[str, "os.PathLike[str]"]
+
+
+class CacheKey(NamedTuple):
+    """Identifies a specific version of a source file.
+
+    The size and mtime allow cheap detection of changes, while the
+    content hash guards against edits which preserve both of them.
+    """
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def compute_key(path: StrPath) -> CacheKey:
+    with open(path, "rb") as stream:
+        stat = os.fstat(stream.fileno())
+        digest = hashlib.sha256()
+        while (chunk := stream.read(1 << 20)):
+            digest.update(chunk)
+    return CacheKey(stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+
+def source_fingerprint(objects: Iterable[Any]) -> str:
+    """Returns a hash of the source files of the provided modules, classes or functions,
+    so that data produced by them can be invalidated whenever their code changes."""
+    digest = hashlib.sha256()
+    sources = {inspect.getsourcefile(i) for i in objects}
+    for source in sorted(filter(None, sources)):
+        digest.update(Path(source).read_bytes())
+    return digest.hexdigest()
+
+
+def cache_path_for(path: StrPath, variant: str) -> Path:
+    """Returns the path to the cache file of the provided source file.
+
+    Different variants (e.g. different loader classes) are stored in separate files,
+    so that alternating between them doesn't cause constant cache rebuilds.
+    """
+    source = Path(path)
+    variant_hash = hashlib.sha256(variant.encode("utf-8")).hexdigest()[:12]
+    return source.parent / CACHE_DIR_NAME / f"{source.name}.{variant_hash}.pickle"
+
+
+def load(path: StrPath, key: CacheKey, variant: str, code: str = "") \
+        -> Optional[Dict[str, Any]]:
+    """Tries to read cached data for a given source file.
+    Returns None if the cache doesn't exist, is stale or can't be read.
+
+    `code` identifies the version of the code which produced the data (see
+    `source_fingerprint`) - data written by a different version is treated as stale.
+    """
+    return read_file(cache_path_for(path, variant), (CACHE_FORMAT_VERSION, variant, code, key))
+
+
+def store(path: StrPath, key: CacheKey, variant: str, code: str, data: Dict[str, Any]) -> None:
+    """Writes data to the cache of a given source file, see `write_file`."""
+    write_file(cache_path_for(path, variant), (CACHE_FORMAT_VERSION, variant, code, key), data)
+
+
+def read_file(target: Path, header: Any) -> Optional[Any]:
+    """Reads data written by `write_file`, provided that it was written with the same header.
+    Returns None otherwise, or if the file doesn't exist or can't be read."""
+    try:
+        with target.open("rb") as stream:
+            if pickle.load(stream) != header:
+                return None
+            return pickle.load(stream)
+    except Exception:
+        # Missing, truncated or otherwise broken cache files are treated as a cache miss
+        return None
+
+
+def write_file(target: Path, header: Any, data: Any) -> None:
+    """Pickles the header and the data to the target file.
+
+    The file is replaced atomically, so concurrent readers will
+    see either the old or the new version, never a partially-written one.
+    Failure to write the file is silently ignored.
+    """
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=target.parent, prefix=target.name, suffix=".tmp")
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            pickle.dump(header, stream, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, stream, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_name, target)
+    except Exception as e:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        if not isinstance(e, OSError):
+            raise
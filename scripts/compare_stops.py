@@ -1,14 +1,17 @@
 import argparse
 import csv
+import io
 import sys
 from pathlib import Path
 from typing import Dict, Iterable, Mapping, NamedTuple, Tuple
 
-from .loader import OSMLoader, Station
+from .compressed import open_decompressed
+from .index import StationIndex
+from .loader import AnyStation, OSMLoader
 from .util import distance
 from .verify import Color
 
-StationLookup: Dict[str, Station]
+StationLookup: Dict[str, AnyStation]
 
 
 class GTFSStation(NamedTuple):
@@ -18,7 +21,8 @@ class GTFSStation(NamedTuple):
 
 
 def load_stations_from(file: Path) -> Iterable[GTFSStation]:
-    with file.open(mode="r", encoding="utf-8-sig", newline="") as buffer:
+    with open_decompressed(file) as raw, \
+            io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as buffer:
         for row in csv.DictReader(buffer):
             # Only care about GTFS stations or GTFS stops without a parent
             is_main_row = row.get("location_type") == "1" or not row.get("parent_station")
@@ -32,7 +36,7 @@ def load_stations_from(file: Path) -> Iterable[GTFSStation]:
             )
 
 
-def compare_stations(stations_by_id: Mapping[str, Station], stops_file: Path,
+def compare_stations(stations_by_id: Mapping[str, AnyStation], stops_file: Path,
                      announce_file: bool = True) -> bool:
     if announce_file:
         print(f"{Color.dim}Comparing {stops_file}{Color.reset}")
@@ -75,11 +79,21 @@ if __name__ == "__main__":
         nargs="+",
         type=Path,
     )
+    argument_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always parse the OSM file, bypassing the cache",
+    )
     args = argument_parser.parse_args()
 
-    all_stations = OSMLoader.load_all("plrailmap.osm").stations
-    stations_by_pkpplk = {i.pkpplk: i for i in all_stations if i.pkpplk}
-    stations_by_ibnr = {i.ibnr: i for i in all_stations if i.ibnr}
+    # The index is built on the fly, while the OSM file is being parsed.
+    # Stations are streamed, so the other loader options don't apply.
+    index = StationIndex()
+    for station in OSMLoader.iter_stations("plrailmap.osm", use_cache=not args.no_cache):
+        index.add(station)
+
+    stations_by_pkpplk = {k: v for k, v in index.unique("ref").items() if k}
+    stations_by_ibnr = {k: v for k, v in index.unique("ref:ibnr").items() if k}
 
     ok = True
 
@@ -0,0 +1,56 @@
+import bz2
+import gzip
+import lzma
+import os
+from typing import BinaryIO, Optional, Union, cast
+
+StrPath = Union[str, "os.PathLike[str]"]
+
+MAGIC_BYTES = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+]
+
+
+def detect_codec(path: StrPath) -> Optional[str]:
+    """Returns the name of the compression used by the file, based on its magic bytes,
+    or None if the file doesn't seem to be compressed."""
+    with open(path, "rb") as stream:
+        head = stream.read(6)
+    return next((codec for magic, codec in MAGIC_BYTES if head.startswith(magic)), None)
+
+
+def open_zstd(path: StrPath) -> BinaryIO:
+    try:
+        from compression import zstd  # type: ignore
+        return cast(BinaryIO, zstd.open(path, "rb"))
+    except ImportError:
+        pass
+
+    try:
+        import zstandard  # type: ignore
+    except ImportError:
+        raise ValueError(f"{path} is zstd-compressed, but neither compression.zstd (Python 3.14+) "
+                         "nor the zstandard module are available") from None
+
+    return cast(BinaryIO, zstandard.ZstdDecompressor().stream_reader(open(path, "rb"),
+                                                                     closefd=True))
+
+
+def open_decompressed(path: StrPath) -> BinaryIO:
+    """Opens a file for binary reading, transparently decompressing gzip, bz2, xz
+    and zstd (if compression.zstd or zstandard is available) files on the fly.
+    The codec is detected from the magic bytes, not the file extension."""
+    codec = detect_codec(path)
+    if codec is None:
+        return open(path, "rb")
+    elif codec == "gzip":
+        return cast(BinaryIO, gzip.open(path, "rb"))
+    elif codec == "bz2":
+        return cast(BinaryIO, bz2.open(path, "rb"))
+    elif codec == "xz":
+        return cast(BinaryIO, lzma.open(path, "rb"))
+    else:
+        return open_zstd(path)
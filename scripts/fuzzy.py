@@ -0,0 +1,121 @@
+import math
+import re
+import unicodedata
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Tuple
+
+EXTRA_FOLDS = str.maketrans({"ł": "l", "ø": "o", "đ": "d", "ß": "ss"})
+"""Letters which don't decompose into a base letter and a combining mark in NFKD."""
+
+NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+EPSILON = 1e-9
+"""Slack of the bounds used for pruning candidates - they are computed with floats,
+and pairs exactly at the bounds mustn't be dropped."""
+
+
+def normalize_name(name: str) -> str:
+    """Normalizes a name for fuzzy comparisons: case-folds it, strips diacritics
+    and replaces all punctuation (e.g. different dashes) by single spaces.
+
+    >>> normalize_name("Warszawa Gdańska")
+    'warszawa gdanska'
+    >>> normalize_name("Goczałkowice–Zdrój")
+    'goczalkowice zdroj'
+    """
+    name = name.casefold().translate(EXTRA_FOLDS)
+    name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    return " ".join(NON_ALPHANUMERIC.sub(" ", name).split())
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Returns the set of 3-character substrings of text, padded with spaces
+    so that the beginning and the end of the text have their own trigrams."""
+    padded = f" {text} "
+    return frozenset(padded[i:i+3] for i in range(len(padded) - 2))
+
+
+def name_trigrams(name: str) -> FrozenSet[str]:
+    """Returns the trigrams of a normalized name."""
+    return trigrams(normalize_name(name))
+
+
+def dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Sørensen–Dice coefficient of 2 sets - 1.0 for equal sets, 0.0 for disjoint sets."""
+    if not a and not b:
+        return 1.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to texts containing them,
+    used to find pairs of texts with similar sets of trigrams.
+
+    Texts are normalized with `normalize_name` (or split into trigrams with the provided
+    `grams_of` function). Similarity is the Dice coefficient of their trigram sets.
+    """
+
+    def __init__(self, texts: Iterable[str],
+                 grams_of: Callable[[str], FrozenSet[str]] = name_trigrams) -> None:
+        self.grams: List[FrozenSet[str]] = [grams_of(i) for i in texts]
+        self.postings: Dict[str, List[int]] = {}
+        for idx, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.grams)
+
+    def prefix(self, i: int, ratio: float) -> List[str]:
+        """Returns trigrams of the i-th text, one of which must be present in every text
+        similar to it.
+
+        If 2 sets of sizes `a` and `b` have a Dice coefficient of at least t, they share
+        at least a·t / (2 - t) elements (`ratio` is t / (2 - t)) and b ≥ a·t / (2 - t).
+        Thus, one of any a - ⌈a·t / (2 - t)⌉ + 1 trigrams of the first text must be present
+        in the second one. The rarest trigrams are chosen, so that only short postings lists
+        are scanned.
+        """
+        grams = self.grams[i]
+        min_overlap = max(math.ceil(len(grams) * ratio - EPSILON), 1)
+        prefix = sorted(grams, key=lambda gram: (len(self.postings[gram]), gram))
+        return prefix[:len(grams) - min_overlap + 1]
+
+    def similar_pairs(self, threshold: float) -> Iterator[Tuple[int, int, float]]:
+        """Yields (i, j, similarity) for all pairs of texts (i < j) with similarity
+        at least `threshold` (which must be positive), ordered by i and j.
+
+        Candidates are pruned with prefix filtering (see `prefix`).
+        """
+        ratio = threshold / (2 - threshold)
+
+        for i, grams in enumerate(self.grams):
+            size = len(grams)
+            if size == 0:
+                continue
+
+            candidates = {j for gram in self.prefix(i, ratio) for j in self.postings[gram] if j > i}
+            for j in sorted(candidates):
+                other_size = len(self.grams[j])
+                if not size * ratio - EPSILON <= other_size <= size / ratio + EPSILON:
+                    continue
+                similarity = dice(grams, self.grams[j])
+                if similarity >= threshold:
+                    yield i, j, similarity
+
+    def similar_to(self, i: int, threshold: float) -> Iterator[Tuple[int, float]]:
+        """Yields (j, similarity) for all other texts with similarity to the i-th one
+        at least `threshold`, ordered by j - the same pairs as `similar_pairs` does."""
+        grams = self.grams[i]
+        size = len(grams)
+        if size == 0:
+            return
+
+        ratio = threshold / (2 - threshold)
+        candidates = {j for gram in self.prefix(i, ratio) for j in self.postings[gram] if j != i}
+        for j in sorted(candidates):
+            other_size = len(self.grams[j])
+            if not size * ratio - EPSILON <= other_size <= size / ratio + EPSILON:
+                continue
+            similarity = dice(grams, self.grams[j])
+            if similarity >= threshold:
+                yield j, similarity
@@ -0,0 +1,329 @@
+import hashlib
+import subprocess
+import sys
+import tempfile
+from importlib import import_module
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from . import cache
+from .index import KEY_GETTERS, StationIndex
+from .loader import PARSER_MODULES, AnyPlatform, AnyStation, OSMLoader
+from .rules import Finding, Rule, index_keys, prepare_rules
+
+SNAPSHOT_FORMAT_VERSION = 2
+MAX_SNAPSHOTS = 4
+"""Number of most recently used snapshots (and separately, findings) kept
+in the cache directory."""
+RULE_MODULES: Tuple[str, ...] = ("fuzzy", "incremental", "index", "loader", "rules", "spatial",
+                                 "util")
+"""Modules of this package which rules depend on, see rules_fingerprint. Modules of the rules
+themselves and the parser (PARSER_MODULES) are taken into account too."""
+
+
+class Snapshot(NamedTuple):
+    """Data of a specific version of the OSM file, together with results of all rules,
+    split by what they depend on.
+    """
+    stations: List[AnyStation]
+    platforms: Dict[str, List[AnyPlatform]]
+    station_index: StationIndex
+    station_findings: Dict[str, Dict[str, List[Finding]]]
+    """Findings of Rule.check_station: rule name → station id → findings"""
+    platform_findings: Dict[str, Dict[str, List[Finding]]]
+    """Findings of Rule.check_platforms: rule name → station ref → findings"""
+    index_findings: Dict[str, List[Finding]]
+    """Findings of Rule.check_index: rule name → findings"""
+    rule_states: Dict[str, Any]
+    """Results of Rule.get_state: rule name → state"""
+
+    def findings(self, rules: Sequence[Rule]) -> Dict[str, List[Finding]]:
+        """Returns all findings, in the same format and order as run_rules."""
+        findings: Dict[str, List[Finding]] = {}
+        for rule in rules:
+            by_station = self.station_findings[rule.name]
+            by_group = self.platform_findings[rule.name]
+            findings[rule.name] = [
+                *(f for station in self.stations for f in by_station.get(station.id, ())),
+                *(f for ref in self.platforms for f in by_group.get(ref, ())),
+                *self.index_findings[rule.name],
+            ]
+        return findings
+
+
+def blob_id(path: Path) -> str:
+    """Returns the id of a git blob with the contents of the file (like git hash-object)."""
+    data = path.read_bytes()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def git(path: Path, *args: str) -> Optional[bytes]:
+    """Runs a git command in the directory of the path. Returns None if it fails."""
+    try:
+        result = subprocess.run(["git", *args], cwd=path.parent, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
+
+
+def revision_blob_id(path: Path, revision: str) -> Optional[str]:
+    """Returns the id of the git blob of the file at a given revision (or None)."""
+    output = git(path, "rev-parse", "--verify", "--quiet", f"{revision}:./{path.name}")
+    return output.decode("ascii").strip() if output else None
+
+
+def rules_fingerprint(rules: Sequence[Rule]) -> str:
+    """Identifies the rules and their implementation - snapshots made with
+    different rules (or after the rules' code has changed) aren't re-used.
+
+    Only plain configuration attributes of the rules are taken into account,
+    not data passed to Rule.prepare.
+    """
+    modules = [import_module(f".{i}", __package__)
+               for i in sorted({*RULE_MODULES, *PARSER_MODULES})]
+    modules.extend(sys.modules[type(rule).__module__] for rule in rules)
+    digest = hashlib.sha256()
+    digest.update(cache.source_fingerprint(modules).encode("ascii"))
+    for rule in rules:
+        config = {k: v for k, v in vars(rule).items()
+                  if isinstance(v, (str, int, float, bool, tuple))}
+        digest.update(repr((rule.name, type(rule).__name__, config)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def snapshot_path(path: Path, blob: str, kind: str) -> Path:
+    return path.parent / cache.CACHE_DIR_NAME / f"{path.name}.verify.{blob[:16]}.{kind}.pickle"
+
+
+def load_snapshot(path: Path, blob: str, fingerprint: str, kind: str = "snapshot") -> Any:
+    """Loads the snapshot (or other data of a given `kind`, e.g. "findings") of the file
+    with the given contents, or returns None if there's no such snapshot."""
+    target = snapshot_path(path, blob, kind)
+    snapshot = cache.read_file(target, (SNAPSHOT_FORMAT_VERSION, blob, fingerprint))
+    if snapshot is not None:
+        target.touch()
+    return snapshot
+
+
+def store_snapshot(path: Path, blob: str, fingerprint: str, snapshot: Any,
+                   kind: str = "snapshot") -> None:
+    """Stores the snapshot and removes all but MAX_SNAPSHOTS most recently used ones
+    of the same kind."""
+    target = snapshot_path(path, blob, kind)
+    cache.write_file(target, (SNAPSHOT_FORMAT_VERSION, blob, fingerprint), snapshot)
+
+    try:
+        existing = sorted(target.parent.glob(f"{path.name}.verify.*.{kind}.pickle"),
+                          key=lambda i: i.stat().st_mtime_ns, reverse=True)
+        for old in existing[MAX_SNAPSHOTS:]:
+            old.unlink()
+    except OSError:
+        pass
+
+
+def full_snapshot(rules: Sequence[Rule], stations: List[AnyStation],
+                  platforms: Dict[str, List[AnyPlatform]]) -> Snapshot:
+    """Runs all rules over all of the data, like run_rules."""
+    index = StationIndex(stations, index_keys(rules))
+    station_findings: Dict[str, Dict[str, List[Finding]]] = {i.name: {} for i in rules}
+    platform_findings: Dict[str, Dict[str, List[Finding]]] = {i.name: {} for i in rules}
+
+    for station in stations:
+        check_station(rules, station, station_findings)
+    for ref, group in platforms.items():
+        check_platforms(rules, ref, index.get("ref", ref), group, platform_findings)
+
+    return Snapshot(stations, platforms, index, station_findings, platform_findings,
+                    check_index(rules, index), rule_states(rules))
+
+
+def check_station(rules: Sequence[Rule], station: AnyStation,
+                  into: Dict[str, Dict[str, List[Finding]]]) -> None:
+    for rule in rules:
+        if findings := list(rule.check_station(station)):
+            into[rule.name][station.id] = findings
+
+
+def check_platforms(rules: Sequence[Rule], ref: str, station: Optional[AnyStation],
+                    platforms: List[AnyPlatform], into: Dict[str, Dict[str, List[Finding]]]) \
+        -> None:
+    for rule in rules:
+        if findings := list(rule.check_platforms(ref, station, platforms)):
+            into[rule.name][ref] = findings
+
+
+def check_index(rules: Sequence[Rule], index: StationIndex) -> Dict[str, List[Finding]]:
+    return {rule.name: list(rule.check_index(index)) for rule in rules}
+
+
+def check_changes(rules: Sequence[Rule], index: StationIndex, changed: Set[str],
+                  findings: Dict[str, List[Finding]]) -> Dict[str, List[Finding]]:
+    """Updates findings of Rule.check_index, with rules which can't do it incrementally
+    re-checking the whole index."""
+    updated: Dict[str, List[Finding]] = {}
+    for rule in rules:
+        result = rule.check_changes(index, changed, findings[rule.name])
+        updated[rule.name] = list(result if result is not None else rule.check_index(index))
+    return updated
+
+
+def rule_states(rules: Sequence[Rule]) -> Dict[str, Any]:
+    return {rule.name: rule.get_state() for rule in rules}
+
+
+def restore_rule_states(rules: Sequence[Rule], snapshot: Snapshot) -> None:
+    for rule in rules:
+        rule.set_state(snapshot.rule_states[rule.name])
+
+
+def update_snapshot(rules: Sequence[Rule], base: Snapshot, stations: List[AnyStation],
+                    platforms: Dict[str, List[AnyPlatform]]) -> Optional[Snapshot]:
+    """Creates a snapshot of the new data, re-running rules only for stations
+    and platform groups which have changed since the base snapshot.
+
+    Returns None if the change can't be handled incrementally (if unchanged stations
+    were reordered, which may change the order of findings) - a full run is required
+    in that case.
+    """
+    old_stations = {i.id: i for i in base.stations}
+    new_stations = {i.id: i for i in stations}
+    changed = {i for i in old_stations.keys() | new_stations.keys()
+               if old_stations.get(i) != new_stations.get(i)}
+
+    if [i.id for i in base.stations if i.id not in changed] \
+            != [i.id for i in stations if i.id not in changed]:
+        return None
+
+    # Update the index in place of the (unpickled, thus private) base snapshot
+    index = base.station_index
+    positions = {station.id: idx for idx, station in enumerate(stations)}
+    touched: Set[Tuple[str, str]] = set()
+    for station_id in changed:
+        if (old := old_stations.get(station_id)) is not None:
+            touched.update(remove_from_index(index, old))
+        if (new := new_stations.get(station_id)) is not None:
+            touched.update(add_to_index(index, new))
+    index.stations = stations
+    restore_index_order(index, touched, positions)
+
+    # Re-run per-station checks on changed stations
+    station_findings = base.station_findings
+    for findings in station_findings.values():
+        for station_id in changed:
+            findings.pop(station_id, None)
+    for station_id in changed:
+        if (new := new_stations.get(station_id)) is not None:
+            check_station(rules, new, station_findings)
+
+    # Re-run per-group platform checks on changed groups, and on groups
+    # whose referenced station may have changed
+    affected_refs = {ref for ref in base.platforms.keys() | platforms.keys()
+                     if base.platforms.get(ref) != platforms.get(ref)}
+    affected_refs.update(value for key, value in touched if key == "ref")
+    platform_findings = base.platform_findings
+    for findings in platform_findings.values():
+        for ref in affected_refs:
+            findings.pop(ref, None)
+    for ref in affected_refs:
+        if (group := platforms.get(ref)) is not None:
+            check_platforms(rules, ref, index.get("ref", ref), group, platform_findings)
+
+    # Global checks are run against the updated index
+    return Snapshot(stations, platforms, index, station_findings, platform_findings,
+                    check_changes(rules, index, changed, base.index_findings),
+                    rule_states(rules))
+
+
+def remove_from_index(index: StationIndex, station: AnyStation) -> Iterable[Tuple[str, str]]:
+    for key, by_value in index.by_key.items():
+        if (value := KEY_GETTERS[key](station)) is not None:
+            remaining = [i for i in by_value[value] if i.id != station.id]
+            if remaining:
+                by_value[value] = remaining
+            else:
+                del by_value[value]
+            yield key, value
+
+
+def add_to_index(index: StationIndex, station: AnyStation) -> Iterable[Tuple[str, str]]:
+    for key, by_value in index.by_key.items():
+        if (value := KEY_GETTERS[key](station)) is not None:
+            by_value.setdefault(value, []).append(station)
+            yield key, value
+
+
+def restore_index_order(index: StationIndex, touched: Iterable[Tuple[str, str]],
+                        positions: Dict[str, int]) -> None:
+    """Restores the order of stations and values of the index to the order in which
+    they would be if the index was built from scratch - stations in the order
+    of the input data, and values in the order of their first stations."""
+    touched_keys: Set[str] = set()
+    for key, value in touched:
+        touched_keys.add(key)
+        if (stations := index.by_key[key].get(value)) is not None:
+            stations.sort(key=lambda i: positions[i.id])
+
+    for key in touched_keys:
+        index.by_key[key] = dict(sorted(index.by_key[key].items(),
+                                        key=lambda i: positions[i[1][0].id]))
+
+
+def base_snapshot(rules: Sequence[Rule], path: Path, revision: str, fingerprint: str) \
+        -> Optional[Snapshot]:
+    """Loads the snapshot of the file at the given git revision. If there's no such snapshot,
+    it is created by parsing the file from that revision (the rules are prepared with
+    that data). Returns None if the file can't be retrieved from git."""
+    if (blob := revision_blob_id(path, revision)) is None:
+        return None
+    if (snapshot := load_snapshot(path, blob, fingerprint)) is not None:
+        return snapshot
+    if (content := git(path, "cat-file", "blob", blob)) is None:
+        return None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir, path.name)
+        temp_path.write_bytes(content)
+        data = OSMLoader.load_all(str(temp_path), use_cache=False)
+
+    prepare_rules(rules, data)
+    snapshot = full_snapshot(rules, data.stations, data.platforms)
+    store_snapshot(path, blob, fingerprint, snapshot)
+    return snapshot
+
+
+def run_rules_incrementally(rules: Sequence[Rule], path: str, revision: str,
+                            load: Callable[[], OSMLoader]) -> Dict[str, List[Finding]]:
+    """Runs the rules over the data of `path` (returned by `load`), re-checking only
+    what has changed since the given git revision.
+
+    Findings are persisted in the cache directory (next to the file), keyed by the contents
+    of the file - runs on the same data (e.g. from a pre-commit hook, and later after
+    the commit against HEAD) return them without even loading the file. Otherwise,
+    the snapshot of the base revision (see Snapshot) is updated with the changes;
+    if there is no snapshot of the base revision, it is created first.
+
+    Findings are always exactly the same as of run_rules.
+    """
+    source = Path(path)
+    fingerprint = rules_fingerprint(rules)
+    current_blob = blob_id(source)
+
+    findings = load_snapshot(source, current_blob, fingerprint, "findings")
+    if findings is not None:
+        return findings
+
+    data = load()
+    base = base_snapshot(rules, source, revision, fingerprint)
+    if base is not None:
+        restore_rule_states(rules, base)
+    prepare_rules(rules, data)
+
+    snapshot = update_snapshot(rules, base, data.stations, data.platforms) if base else None
+    if snapshot is None:
+        snapshot = full_snapshot(rules, data.stations, data.platforms)
+    findings = snapshot.findings(rules)
+
+    store_snapshot(source, current_blob, fingerprint, snapshot)
+    store_snapshot(source, current_blob, fingerprint, findings, "findings")
+    return findings
@@ -0,0 +1,67 @@
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .loader import AnyStation
+
+KEY_GETTERS: Dict[str, Callable[[AnyStation], Optional[str]]] = {
+    "id": lambda station: station.id,
+    "ref": lambda station: station.pkpplk,
+    "ref:2": lambda station: station.other_tags.get("ref:2"),
+    "ref:ibnr": lambda station: station.ibnr,
+    "ref:ztmw": lambda station: station.other_tags.get("ref:ztmw"),
+    "name": lambda station: station.name,
+}
+"""Keys by which stations are indexed, named after the OSM tags they come from
+(except for "id", the node id)."""
+
+
+class StationIndex:
+    """Lookups of stations by all of their identifiers, built in a single pass.
+
+    Every key maps values to all stations with that value (in the order of insertion),
+    so that the same index is usable both for lookups and for finding duplicates.
+    Stations without a value for a given key (e.g. without ref:ibnr) aren't indexed
+    under that key. By default all KEY_GETTERS are indexed, which can be limited
+    with `keys`.
+    """
+
+    def __init__(self, stations: Iterable[AnyStation] = (),
+                 keys: Iterable[str] = KEY_GETTERS) -> None:
+        self.stations: List[AnyStation] = []
+        self.by_key: Dict[str, Dict[str, List[AnyStation]]] = {key: {} for key in keys}
+        for station in stations:
+            self.add(station)
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def add(self, station: AnyStation) -> None:
+        self.stations.append(station)
+        for key, by_value in self.by_key.items():
+            value = KEY_GETTERS[key](station)
+            if value is not None:
+                by_value.setdefault(value, []).append(station)
+
+    def get(self, key: str, value: str) -> Optional[AnyStation]:
+        """Returns the last station with the provided value of a key, or None.
+
+        The last station wins (like in a dict built from all stations), so that
+        lookups of duplicated values don't depend on how the index is used.
+        """
+        matches = self.by_key[key].get(value)
+        return matches[-1] if matches else None
+
+    def get_all(self, key: str, value: str) -> List[AnyStation]:
+        return self.by_key[key].get(value, [])
+
+    def get_by_pkpplk(self, code: str) -> Optional[AnyStation]:
+        """Returns the station with the provided PKP PLK code, either primary or secondary."""
+        return self.get("ref", code) or self.get("ref:2", code)
+
+    def collisions(self, key: str) -> List[List[AnyStation]]:
+        """Returns groups of (2 or more) stations sharing the same value of a key."""
+        return [stations for stations in self.by_key[key].values() if len(stations) > 1]
+
+    def unique(self, key: str) -> Dict[str, AnyStation]:
+        """Returns a mapping from values of a key to the last station with that value
+        (see `get`)."""
+        return {value: stations[-1] for value, stations in self.by_key[key].items()}
@@ -1,8 +1,21 @@
-import math
-from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+import sys
+from argparse import ArgumentParser, Namespace
+from array import array
+from importlib import import_module
+from importlib.util import find_spec
+from typing import (AbstractSet, BinaryIO, Callable, Dict, FrozenSet, Iterator, List, Mapping,
+                    NamedTuple, Optional, Tuple, Union, cast)
+from xml.parsers.expat import ParserCreate as expat_parser_create
+from xml.parsers.expat import XMLParserType
 from xml.sax import parse as sax_parse
 from xml.sax.handler import ContentHandler as SAXContentHandler
 
+from . import cache
+from .compressed import detect_codec, open_decompressed
+from .nodes import NodeStore
+from .pbf import feed_block, iter_blocks, parse_pbf
+from .scanner import parse_scanner
+
 
 class Station(NamedTuple):
     id: str
@@ -21,52 +34,614 @@ class Platform(NamedTuple):
     other_tags: Dict[str, str]
 
 
+STATION_FIELD_TAGS: FrozenSet[str] = frozenset({"_id", "name", "ref", "ref:ibnr", "railway"})
+PLATFORM_FIELD_TAGS: FrozenSet[str] = frozenset({"_id", "name", "ref:station", "public_transport"})
+
+NO_TAGS: Dict[str, str] = {}
+"""Shared other_tags of compact records without any leftover tags - must not be modified."""
+
+
+class CompactStation:
+    """Memory-efficient alternative to Station, created with LoadOptions.compact.
+
+    Uses __slots__ instead of a tuple, keeps the position as two floats, and `other_tags`
+    only contains tags not already represented by other attributes (so no "_id", "name",
+    "ref", "ref:ibnr" nor the implied "railway"). Stations without such tags share
+    a single empty dictionary (NO_TAGS), which must not be modified.
+    """
+    __slots__ = ("id", "name", "pkpplk", "ibnr", "lat", "lon", "other_tags")
+
+    def __init__(self, id: str, name: str, pkpplk: str, ibnr: Optional[str], lat: float,
+                 lon: float, other_tags: Dict[str, str]) -> None:
+        self.id = id
+        self.name = name
+        self.pkpplk = pkpplk
+        self.ibnr = ibnr
+        self.lat = lat
+        self.lon = lon
+        self.other_tags = other_tags
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        return self.lat, self.lon
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CompactStation) \
+            and all(getattr(self, i) == getattr(other, i) for i in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"CompactStation(id={self.id!r}, name={self.name!r}, pkpplk={self.pkpplk!r}, " \
+            f"ibnr={self.ibnr!r}, position={self.position!r}, other_tags={self.other_tags!r})"
+
+
+class CompactPlatform:
+    """Memory-efficient alternative to Platform, created with LoadOptions.compact.
+    See CompactStation - `other_tags` omits "_id", "name", "ref:station" and the implied
+    "public_transport"."""
+    __slots__ = ("id", "name", "station", "lat", "lon", "other_tags")
+
+    def __init__(self, id: str, name: str, station: str, lat: float, lon: float,
+                 other_tags: Dict[str, str]) -> None:
+        self.id = id
+        self.name = name
+        self.station = station
+        self.lat = lat
+        self.lon = lon
+        self.other_tags = other_tags
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        return self.lat, self.lon
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CompactPlatform) \
+            and all(getattr(self, i) == getattr(other, i) for i in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"CompactPlatform(id={self.id!r}, name={self.name!r}, " \
+            f"station={self.station!r}, position={self.position!r}, " \
+            f"other_tags={self.other_tags!r})"
+
+
+def leftover_tags(tags: Dict[str, str], field_tags: FrozenSet[str]) -> Dict[str, str]:
+    leftover = {k: v for k, v in tags.items() if k not in field_tags}
+    return leftover or NO_TAGS
+
+
+class Way(NamedTuple):
+    id: str
+    nodes: "array[int]"
+    tags: Dict[str, str]
+
+
+AnyStation = Union[Station, CompactStation]
+AnyPlatform = Union[Platform, CompactPlatform]
+"""Stations and platforms are CompactStation and CompactPlatform objects
+if loaded with LoadOptions.compact set."""
+
+Entity = Union[AnyStation, AnyPlatform, Way]
+
+ALL_KINDS: FrozenSet[str] = frozenset({"stations", "platforms", "ways"})
+
+FIELD_TAGS: FrozenSet[str] = frozenset({"railway", "public_transport", "name", "ref", "ref:ibnr",
+                                        "ref:station"})
+"""Tags required to classify nodes and to fill Station/Platform fields."""
+
+
+class LoadOptions(NamedTuple):
+    """Selects which data is loaded from the OSM file.
+
+    Anything not matching the options is dropped while parsing,
+    before any Station/Platform/Way objects are created.
+    """
+
+    kinds: AbstractSet[str] = ALL_KINDS
+    """Which of "stations", "platforms" and "ways" to load. Node positions
+    (OSMLoader.nodes) are only collected if ways are loaded."""
+
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    """(min_lat, min_lon, max_lat, max_lon) - nodes outside of this box are skipped.
+    Ways are kept if at least one of their nodes is inside the box, together with
+    positions of all of their nodes (also of those outside of the box)."""
+
+    required_tags: Mapping[str, Optional[str]] = {}
+    """Tags which stations and platforms must have. A None value only requires
+    the key to be present."""
+
+    keep_tags: Optional[AbstractSet[str]] = None
+    """If not None, only those keys (in addition to FIELD_TAGS and "_id")
+    are kept in other_tags of stations and platforms."""
+
+    compact: bool = False
+    """Create CompactStation and CompactPlatform objects instead of Station and Platform,
+    and intern all tag keys and values."""
+
+    fixed_point: bool = False
+    """Store node positions (OSMLoader.nodes) as int32 fixed-point values
+    with 1e-7 degree resolution, instead of doubles."""
+
+    def describe(self) -> str:
+        """Returns a deterministic description of the options, suitable for cache keys."""
+        return repr((
+            sorted(self.kinds),
+            self.bbox,
+            sorted(self.required_tags.items()),
+            sorted(self.keep_tags) if self.keep_tags is not None else None,
+            self.compact,
+            self.fixed_point,
+        ))
+
+    def matches_bbox(self, lat: float, lon: float) -> bool:
+        return self.bbox is None or (
+            self.bbox[0] <= lat <= self.bbox[2] and self.bbox[1] <= lon <= self.bbox[3]
+        )
+
+    def matches_required_tags(self, tags: Mapping[str, str]) -> bool:
+        return all(
+            key in tags and (value is None or tags[key] == value)
+            for key, value in self.required_tags.items()
+        )
+
+
+PARSER_MODULES: Tuple[str, ...] = ("compressed", "loader", "nodes", "parallel", "pbf", "scanner",
+                                   "util")
+"""Modules of this package whose code affects the parsed data, see OSMLoader.cache_variant."""
+
+
 class OSMLoader(SAXContentHandler):
-    def __init__(self) -> None:
+    CACHED_ATTRIBUTES: Tuple[str, ...] = ("stations", "platforms", "ways", "nodes")
+
+    def __init__(self, options: LoadOptions = LoadOptions()) -> None:
         super().__init__()
-        self.tags: Dict[str, str] = {}
-        self.position: Tuple[float, float] = math.nan, math.nan
-        self.stations: List[Station] = []
-        self.platforms: Dict[str, List[Platform]] = {}
+        self.options = options
+        self.load_stations = "stations" in options.kinds
+        self.load_platforms = "platforms" in options.kinds
+        self.load_ways = "ways" in options.kinds
+        self.compact = options.compact
+        self.kept_tags: Optional[FrozenSet[str]] = None
+        if options.keep_tags is not None:
+            self.kept_tags = FIELD_TAGS.union(options.keep_tags, options.required_tags)
+
+        self.node_id: str = ""
+        self.node_lat: Union[str, float] = ""
+        self.node_lon: Union[str, float] = ""
+        self.tags: Optional[Dict[str, str]] = None
+        self.stations: List[AnyStation] = []
+        self.platforms: Dict[str, List[AnyPlatform]] = {}
         self.in_node: bool = False
 
+        self.way_id: str = ""
+        self.way_nodes: "array[int]" = array("q")
+        self.way_tags: Dict[str, str] = {}
+        self.ways: List[Way] = []
+        self.nodes: NodeStore = NodeStore(options.fixed_point)
+        self.in_way: bool = False
+
+        # When set, parsed entities are appended here instead of being collected
+        # in stations/platforms/ways - used by iter_entities.
+        self.stream: Optional[List[Entity]] = None
+
+        # Whether to drop ways outside of options.bbox in end_way. Requires
+        # positions of all nodes to be known at that point.
+        self.check_way_bbox: bool = True
+
     def startElement(self, name: str, attrs: Mapping[str, str]):
         if name == "node":
-            self.tags = {"_id": attrs["id"]}
-            self.position = (float(attrs["lat"]), float(attrs["lon"]))
-            self.in_node = True
-        elif name == "tag" and self.in_node:
-            if attrs["k"].startswith("_"):
-                raise ValueError("Starting a tag with an underscore messes with processing")
-            self.tags[attrs["k"]] = attrs["v"]
+            self.start_node(attrs["id"], attrs["lat"], attrs["lon"])
+        elif name == "nd":
+            if self.in_way:
+                self.way_node(attrs["ref"])
+        elif name == "tag":
+            if self.in_node:
+                self.node_tag(attrs["k"], attrs["v"])
+            elif self.in_way:
+                self.way_tag(attrs["k"], attrs["v"])
+        elif name == "way":
+            self.start_way(attrs["id"])
 
     def endElement(self, name: str):
         if name == "node":
-            self.in_node = False
-
-            if self.tags.get("railway") == "station":
-                self.stations.append(Station(
-                    id=self.tags["_id"],
-                    name=self.tags["name"],
-                    pkpplk=self.tags["ref"],
-                    ibnr=self.tags.get("ref:ibnr"),
-                    position=self.position,
-                    other_tags=self.tags,
+            self.end_node()
+        elif name == "way":
+            self.end_way()
+
+    def start_node(self, node_id: str, lat: Union[str, float], lon: Union[str, float]) -> None:
+        # Most nodes are untagged geometry nodes, which are thrown away in end_node.
+        # The tag dictionary and the position are only created once it's known
+        # that the node has tags.
+        self.node_id = node_id
+        self.node_lat = lat
+        self.node_lon = lon
+        self.tags = None
+
+        # Nodes outside of the bounding box are skipped - their tags are never collected.
+        # Their positions are still needed by ways crossing the box, which come later
+        # in the file - unused ones are dropped once parsing is done (drop_unused_nodes).
+        self.in_node = self.options.bbox is None \
+            or self.options.matches_bbox(float(lat), float(lon))
+        if not self.in_node and self.load_ways and self.stream is None:
+            self.nodes.add(int(node_id), float(lat), float(lon))
+
+    def node_tag(self, key: str, value: str) -> None:
+        if key.startswith("_"):
+            raise ValueError("Starting a tag with an underscore messes with processing")
+        elif self.kept_tags is not None and key not in self.kept_tags:
+            return
+
+        if self.compact:
+            key = sys.intern(key)
+            value = sys.intern(value)
+
+        if self.tags is None:
+            self.tags = {"_id": self.node_id}
+        self.tags[key] = value
+
+    def end_node(self) -> None:
+        if not self.in_node:
+            return
+        self.in_node = False
+
+        if self.load_ways and self.stream is None:
+            self.nodes.add(int(self.node_id), float(self.node_lat), float(self.node_lon))
+
+        tags = self.tags
+        if tags is None:
+            return
+        self.tags = None
+
+        if self.options.required_tags and not self.options.matches_required_tags(tags):
+            return
+
+        lat = float(self.node_lat)
+        lon = float(self.node_lon)
+
+        if tags.get("railway") == "station":
+            if not self.load_stations:
+                return
+            elif self.compact:
+                self.add_station(CompactStation(
+                    id=tags["_id"],
+                    name=tags["name"],
+                    pkpplk=tags["ref"],
+                    ibnr=tags.get("ref:ibnr"),
+                    lat=lat,
+                    lon=lon,
+                    other_tags=leftover_tags(tags, STATION_FIELD_TAGS),
                 ))
+                return
 
-            elif self.tags.get("public_transport") == "platform":
-                station = self.tags["ref:station"]
-                self.platforms.setdefault(station, []).append(Platform(
-                    id=self.tags["_id"],
-                    name=self.tags["name"],
-                    station=station,
-                    position=self.position,
-                    other_tags=self.tags,
+            self.add_station(Station(
+                id=tags["_id"],
+                name=tags["name"],
+                pkpplk=tags["ref"],
+                ibnr=tags.get("ref:ibnr"),
+                position=(lat, lon),
+                other_tags=tags,
+            ))
+
+        elif tags.get("public_transport") == "platform":
+            if not self.load_platforms:
+                return
+            elif self.compact:
+                self.add_platform(CompactPlatform(
+                    id=tags["_id"],
+                    name=tags["name"],
+                    station=tags["ref:station"],
+                    lat=lat,
+                    lon=lon,
+                    other_tags=leftover_tags(tags, PLATFORM_FIELD_TAGS),
                 ))
+                return
+
+            self.add_platform(Platform(
+                id=tags["_id"],
+                name=tags["name"],
+                station=tags["ref:station"],
+                position=(lat, lon),
+                other_tags=tags,
+            ))
+
+    def start_way(self, way_id: str) -> None:
+        self.way_id = way_id
+        self.way_nodes = array("q")
+        self.way_tags = {}
+        self.in_way = self.load_ways
+
+    def way_node(self, ref: Union[str, int]) -> None:
+        self.way_nodes.append(int(ref))
+
+    def way_tag(self, key: str, value: str) -> None:
+        self.way_tags[key] = value
+
+    def end_way(self) -> None:
+        if not self.in_way:
+            return
+        self.in_way = False
+
+        # Only railway lines are interesting, skip any other (e.g. helper) ways
+        if "railway" not in self.way_tags:
+            return
+
+        way = Way(self.way_id, self.way_nodes, self.way_tags)
+        if self.options.bbox is not None and self.check_way_bbox \
+                and not self.is_way_in_bbox(way):
+            return
+
+        self.add_way(way)
+
+    def is_way_in_bbox(self, way: Way) -> bool:
+        """Checks if any (known) node of the way is inside of the bounding box."""
+        for ref in way.nodes:
+            position = self.nodes.get(ref)
+            if position is not None and self.options.matches_bbox(*position):
+                return True
+        return False
+
+    def drop_unused_nodes(self) -> None:
+        """Drops positions of nodes outside of the bounding box which aren't used by any
+        of the kept ways. Called once the whole file is parsed."""
+        if self.options.bbox is None or not self.load_ways:
+            return
+        used = {ref for way in self.ways for ref in way.nodes}
+        self.nodes.retain(lambda node_id, lat, lon:
+                          node_id in used or self.options.matches_bbox(lat, lon))
+
+    def add_station(self, station: Union[Station, CompactStation]) -> None:
+        if self.stream is not None:
+            self.stream.append(station)
+        else:
+            self.stations.append(station)
+
+    def add_platform(self, platform: Union[Platform, CompactPlatform]) -> None:
+        if self.stream is not None:
+            self.stream.append(platform)
+        else:
+            self.platforms.setdefault(platform.station, []).append(platform)
+
+    def add_way(self, way: Way) -> None:
+        if self.stream is not None:
+            self.stream.append(way)
+        else:
+            self.ways.append(way)
+
+    def way_positions(self, way: Way) -> List[Tuple[float, float]]:
+        """Returns the positions of all nodes of a way."""
+        return self.nodes.positions(way.nodes)
+
+    @classmethod
+    def cache_variant(cls, options: LoadOptions = LoadOptions()) -> str:
+        """Returns a string describing the kind of data produced by this loader,
+        used to keep caches from different loaders and options apart."""
+        return f"{cls.__module__}.{cls.__qualname__}:{','.join(cls.CACHED_ATTRIBUTES)}:" \
+            + options.describe()
 
     @classmethod
-    def load_all(cls, path: str) -> "OSMLoader":
-        handler = cls()
-        with open(path, "rb") as stream:
-            sax_parse(stream, handler)
+    def code_fingerprint(cls) -> str:
+        """Returns a hash of the parsing code (PARSER_MODULES and the loader class).
+        Caches made by a different version of the code are discarded."""
+        modules = [import_module(f".{i}", __package__) for i in PARSER_MODULES]
+        return cache.source_fingerprint([cls, *modules])
+
+    @classmethod
+    def load_all(cls, path: str, use_cache: bool = True, rebuild_cache: bool = False,
+                 backend: str = "auto", options: LoadOptions = LoadOptions(), jobs: int = 1) \
+            -> "OSMLoader":
+        """Parses the whole OSM file, keeping only data selected by `options`.
+
+        Unless `use_cache` is False, the parsed data is stored in a binary cache
+        (see scripts/cache.py) next to the source file, and re-used on subsequent calls
+        as long as the file's size, mtime and content hash, as well as the parsing code
+        (see `code_fingerprint`), remain unchanged.
+        `rebuild_cache` forces the file to be parsed and the cache to be overwritten.
+
+        `backend` selects the XML parser - see `BACKENDS`. All backends produce the same data,
+        so the choice doesn't affect the cache.
+
+        With `jobs` > 1, the file is parsed in chunks by a pool of processes
+        (see scripts/parallel.py). The resulting data is exactly the same.
+
+        Compressed files (gzip, bz2, xz, zstd) are decompressed on the fly,
+        see scripts/compressed.py.
+
+        Files ending with ".pbf" are read with the PBF decoder (see scripts/pbf.py) instead,
+        with `jobs` processes decoding the blocks.
+        """
+        backend = resolve_backend(backend)
+        if not use_cache:
+            return cls.parse(path, backend, options, jobs)
+
+        variant = cls.cache_variant(options)
+        code = cls.code_fingerprint()
+        key = cache.compute_key(path)
+
+        if not rebuild_cache and (cached := cache.load(path, key, variant, code)) is not None:
+            handler = cls(options)
+            for attr, value in cached.items():
+                setattr(handler, attr, value)
+            return handler
+
+        handler = cls.parse(path, backend, options, jobs)
+
+        # Don't store data from a file which has changed while it was parsed
+        if cache.compute_key(path) == key:
+            cache.store(path, key, variant, code,
+                        {attr: getattr(handler, attr) for attr in cls.CACHED_ATTRIBUTES})
+
         return handler
+
+    @classmethod
+    def iter_entities(cls, path: str, options: LoadOptions = LoadOptions(),
+                      chunk_size: int = 1 << 16) -> Iterator[Entity]:
+        """Parses the OSM file incrementally, yielding Stations, Platforms and Ways
+        (selected by `options`) in file order as soon as they are parsed.
+
+        Nothing is retained by the loader itself (node positions aren't collected either),
+        so memory usage stays flat for callers which don't keep the yielded objects.
+        Like with `parse`, files ending with ".pbf" are read with the PBF decoder.
+        """
+        handler = cls(options)
+        handler.stream = []
+        handler.check_way_bbox = False  # node positions aren't collected when streaming
+
+        if path.endswith(".pbf"):
+            for block in iter_blocks(path):
+                feed_block(block, handler)
+                yield from handler.stream
+                handler.stream.clear()
+            return
+
+        parser = create_expat_parser(handler)
+
+        with open_decompressed(path) as stream:
+            while (chunk := stream.read(chunk_size)):
+                parser.Parse(chunk, False)
+                yield from handler.stream
+                handler.stream.clear()
+
+        parser.Parse(b"", True)
+        yield from handler.stream
+        handler.stream.clear()
+
+    @classmethod
+    def iter_stations(cls, path: str, use_cache: bool = True,
+                      options: LoadOptions = LoadOptions()) -> Iterator[AnyStation]:
+        """Yields Stations (or CompactStations) from the OSM file in file order,
+        without collecting them.
+
+        If `use_cache` is set and a fresh cache of this loader with the same options exists,
+        stations are taken from the cache. The cache is never written by this function.
+        """
+        if use_cache:
+            cached = cache.load(path, cache.compute_key(path), cls.cache_variant(options),
+                                cls.code_fingerprint())
+            if cached is not None:
+                yield from cached["stations"]
+                return
+
+        # Only stations are parsed with these options
+        options = options._replace(kinds=options.kinds & {"stations"})
+        yield from cast(Iterator[AnyStation], cls.iter_entities(path, options))
+
+    @classmethod
+    def iter_platforms(cls, path: str, options: LoadOptions = LoadOptions()) \
+            -> Iterator[AnyPlatform]:
+        """Yields Platforms (or CompactPlatforms) from the OSM file in file order (rather than
+        grouped by station, like `OSMLoader.platforms`), without collecting them."""
+        # Only platforms are parsed with these options
+        options = options._replace(kinds=options.kinds & {"platforms"})
+        yield from cast(Iterator[AnyPlatform], cls.iter_entities(path, options))
+
+    @classmethod
+    def parse(cls, path: str, backend: str = "auto", options: LoadOptions = LoadOptions(),
+              jobs: int = 1) -> "OSMLoader":
+        backend = resolve_backend(backend)
+        if path.endswith(".pbf"):
+            handler = parse_pbf(cls, path, options, jobs)
+        # Compressed files can't be split into chunks without decompressing them first
+        elif jobs > 1 and detect_codec(path) is None:
+            from .parallel import parse_in_parallel
+            handler = parse_in_parallel(cls, path, jobs, backend, options)
+        else:
+            handler = cls(options)
+            with open_decompressed(path) as stream:
+                BACKENDS[backend](stream, handler)
+
+        handler.drop_unused_nodes()
+        return handler
+
+
+def parse_sax(stream: BinaryIO, handler: OSMLoader) -> None:
+    sax_parse(stream, handler)
+
+
+def create_expat_parser(handler: OSMLoader) -> "XMLParserType":
+    # Expat calls the handler directly, skipping the xml.sax driver and its AttributesImpl
+    # wrappers. Attributes are kept as plain dicts (ordered_attributes is off), as the handler
+    # looks them up by name. No character data handler is installed, so expat doesn't
+    # even build text strings for the whitespace between elements.
+    parser = expat_parser_create()
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    return parser
+
+
+def parse_expat(stream: BinaryIO, handler: OSMLoader) -> None:
+    create_expat_parser(handler).ParseFile(stream)
+
+
+def parse_lxml(stream: BinaryIO, handler: OSMLoader) -> None:
+    from lxml import etree  # type: ignore
+
+    for event, element in etree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            handler.startElement(element.tag, element.attrib)
+        else:
+            handler.endElement(element.tag)
+
+            # Free already-processed elements, so that the tree doesn't grow
+            if element.tag != "tag":
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+
+BACKENDS: Dict[str, Callable[[BinaryIO, OSMLoader], None]] = {
+    "expat": parse_expat,
+    "lxml": parse_lxml,
+    "sax": parse_sax,
+    "scanner": parse_scanner,
+}
+"""Available XML parsers, in the order of preference for automatic selection."""
+
+
+def is_backend_available(name: str) -> bool:
+    return name != "lxml" or find_spec("lxml") is not None
+
+
+def resolve_backend(name: str) -> str:
+    """Maps "auto" to the most preferred available backend, and validates other names."""
+    if name == "auto":
+        return next(i for i in BACKENDS if is_backend_available(i))
+    elif name not in BACKENDS:
+        raise ValueError(f"Unknown OSM parser backend: {name!r}")
+    elif not is_backend_available(name):
+        raise ValueError(f"OSM parser backend {name!r} is not available")
+    return name
+
+
+def add_loader_arguments(parser: ArgumentParser) -> None:
+    """Adds CLI options controlling how plrailmap.osm is loaded."""
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always parse the OSM file, bypassing the cache",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="parse the OSM file and overwrite the cache",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["auto", *BACKENDS],
+        default="auto",
+        help="XML parser used to read the OSM file",
+    )
+    parser.add_argument(
+        "--parse-jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse the OSM file",
+    )
+
+
+def load_from_args(args: Namespace, path: str = "plrailmap.osm") -> OSMLoader:
+    """Loads the OSM file according to options added by `add_loader_arguments`."""
+    return OSMLoader.load_all(
+        path,
+        use_cache=not args.no_cache,
+        rebuild_cache=args.rebuild_cache,
+        backend=args.backend,
+        jobs=args.parse_jobs,
+    )
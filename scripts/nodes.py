@@ -0,0 +1,134 @@
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .util import from_fixed_point, to_fixed_point
+
+
+class NodeStore:
+    """Compact mapping from node ids to their positions.
+
+    Instead of a dict of tuples, ids and coordinates are kept in 3 parallel arrays,
+    using 24 bytes per node. Lookups use binary search over the ids, which
+    are sorted lazily before the first lookup.
+
+    With `fixed_point` set, coordinates are stored as int32 multiples of 1e-7 degrees
+    (see util.FIXED_POINT_SCALE), bringing the size down to 16 bytes per node.
+    They are converted back to floats only when positions are retrieved.
+    """
+
+    def __init__(self, fixed_point: bool = False) -> None:
+        self.fixed_point = fixed_point
+        self.ids = array("q")
+        self.lats: "array[Any]" = array("i" if fixed_point else "d")
+        self.lons: "array[Any]" = array("i" if fixed_point else "d")
+        self.is_sorted: bool = True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node_id: object) -> bool:
+        if not isinstance(node_id, int):
+            return False
+        self.ensure_sorted()
+        idx = bisect_left(self.ids, node_id)
+        return idx < len(self.ids) and self.ids[idx] == node_id
+
+    def __iter__(self) -> Iterator[int]:
+        self.ensure_sorted()
+        return iter(self.ids)
+
+    def add(self, node_id: int, lat: float, lon: float) -> None:
+        if self.is_sorted and self.ids and node_id <= self.ids[-1]:
+            self.is_sorted = False
+        self.ids.append(node_id)
+        if self.fixed_point:
+            self.lats.append(to_fixed_point(lat))
+            self.lons.append(to_fixed_point(lon))
+        else:
+            self.lats.append(lat)
+            self.lons.append(lon)
+
+    def extend(self, other: "NodeStore") -> None:
+        if self.fixed_point != other.fixed_point:
+            raise ValueError("can't mix fixed-point and floating-point NodeStores")
+        if self.is_sorted and (not other.is_sorted
+                               or (self.ids and other.ids and other.ids[0] <= self.ids[-1])):
+            self.is_sorted = False
+        self.ids.extend(other.ids)
+        self.lats.extend(other.lats)
+        self.lons.extend(other.lons)
+
+    def ensure_sorted(self) -> None:
+        if self.is_sorted:
+            return
+
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        self.ids = array("q", (self.ids[i] for i in order))
+        self.lats = array(self.lats.typecode, (self.lats[i] for i in order))
+        self.lons = array(self.lons.typecode, (self.lons[i] for i in order))
+        self.is_sorted = True
+
+    def index_of(self, node_id: int) -> int:
+        self.ensure_sorted()
+        idx = bisect_left(self.ids, node_id)
+        if idx == len(self.ids) or self.ids[idx] != node_id:
+            raise KeyError(node_id)
+        return idx
+
+    def position(self, node_id: int) -> Tuple[float, float]:
+        return self.position_at(self.index_of(node_id))
+
+    def position_at(self, idx: int) -> Tuple[float, float]:
+        if self.fixed_point:
+            return from_fixed_point(self.lats[idx]), from_fixed_point(self.lons[idx])
+        return self.lats[idx], self.lons[idx]
+
+    def get(self, node_id: int) -> Optional[Tuple[float, float]]:
+        """Returns the position of a node, or None if it's unknown."""
+        try:
+            return self.position(node_id)
+        except KeyError:
+            return None
+
+    def positions(self, node_ids: Iterable[int]) -> List[Tuple[float, float]]:
+        return [self.position(i) for i in node_ids]
+
+    def positions_by_id(self, node_ids: Iterable[int]) -> Dict[int, Tuple[float, float]]:
+        """Returns the positions of many nodes at once, keyed by their ids.
+
+        The ids are resolved in a single pass over the store: they are sorted first,
+        so every search starts where the previous one ended, and runs of consecutive
+        nodes need no binary search at all. Unknown nodes are left out of the result.
+        """
+        self.ensure_sorted()
+        ids = self.ids
+        count = len(ids)
+        found: List[int] = []
+        indices: List[int] = []
+        idx = 0
+        for node_id in sorted(set(node_ids)):
+            if idx < count and ids[idx] != node_id:
+                idx = bisect_left(ids, node_id, idx)
+            if idx == count:
+                break
+            if ids[idx] == node_id:
+                found.append(node_id)
+                indices.append(idx)
+                idx += 1
+
+        if self.fixed_point:
+            return {
+                node_id: (from_fixed_point(self.lats[idx]), from_fixed_point(self.lons[idx]))
+                for node_id, idx in zip(found, indices)
+            }
+        lats = map(self.lats.__getitem__, indices)
+        lons = map(self.lons.__getitem__, indices)
+        return dict(zip(found, zip(lats, lons)))
+
+    def retain(self, keep: Callable[[int, float, float], bool]) -> None:
+        """Removes all nodes for which `keep(node_id, lat, lon)` is False."""
+        kept = [idx for idx in range(len(self.ids)) if keep(self.ids[idx], *self.position_at(idx))]
+        self.ids = array("q", (self.ids[i] for i in kept))
+        self.lats = array(self.lats.typecode, (self.lats[i] for i in kept))
+        self.lons = array(self.lons.typecode, (self.lons[i] for i in kept))
@@ -0,0 +1,92 @@
+import mmap
+import re
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Type
+
+if TYPE_CHECKING:
+    from .loader import LoadOptions, OSMLoader
+
+ELEMENT_START = re.compile(rb"<(?:node|way|relation)[\s/>]")
+
+MIN_CHUNK_SIZE = 1 << 18
+
+
+def split_into_chunks(data: "mmap.mmap", count: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """Splits an OSM file into (roughly) `count` ranges of whole top-level elements.
+
+    Returns the offset of the first element (everything before it is the header, which has
+    to be prepended to every chunk) and the [start, end) byte ranges of the chunks.
+    The last chunk ends with the closing </osm> tag, other chunks need it appended.
+
+    A literal "<node" can't appear inside attribute values (it'd have to be escaped),
+    so any match of ELEMENT_START is a real element boundary.
+    """
+    first = ELEMENT_START.search(data)
+    if first is None:
+        return len(data), [(len(data), len(data))]
+
+    header_end = first.start()
+    chunk_size = max((len(data) - header_end) // count, MIN_CHUNK_SIZE)
+    boundaries = [header_end]
+
+    while (target := boundaries[-1] + chunk_size) < len(data):
+        match = ELEMENT_START.search(data, target)
+        if match is None:
+            break
+        boundaries.append(match.start())
+
+    boundaries.append(len(data))
+    return header_end, list(zip(boundaries, boundaries[1:]))
+
+
+def parse_chunk(loader: "Type[OSMLoader]", path: str, header_end: int, start: int, end: int,
+                backend: str, options: "LoadOptions") -> Dict[str, Any]:
+    from .loader import BACKENDS
+
+    with open(path, "rb") as stream:
+        header = stream.read(header_end)
+        stream.seek(start)
+        body = stream.read(end - start)
+
+    closing = b"" if body.rstrip().endswith(b"</osm>") else b"</osm>"
+    handler = loader(options)
+
+    # Ways may reference nodes from other chunks - the bounding box check
+    # has to be done after merging all chunks.
+    handler.check_way_bbox = False
+
+    BACKENDS[backend](BytesIO(header + body + closing), handler)
+    return {attr: getattr(handler, attr) for attr in loader.CACHED_ATTRIBUTES}
+
+
+def parse_in_parallel(loader: "Type[OSMLoader]", path: str, jobs: int, backend: str,
+                      options: "LoadOptions") -> "OSMLoader":
+    """Parses the OSM file split into chunks in a pool of `jobs` processes.
+
+    Results are merged in the order of chunks, so the data is exactly the same
+    as if the file was parsed sequentially.
+    """
+    with open(path, "rb") as stream, \
+            mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header_end, chunks = split_into_chunks(data, jobs)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(parse_chunk, loader, path, header_end, start, end, backend, options)
+            for start, end in chunks
+        ]
+        results = [future.result() for future in futures]
+
+    handler = loader(options)
+    for result in results:
+        handler.stations.extend(result["stations"])
+        for station_id, platforms in result["platforms"].items():
+            handler.platforms.setdefault(station_id, []).extend(platforms)
+        handler.ways.extend(result["ways"])
+        handler.nodes.extend(result["nodes"])
+
+    if options.bbox is not None:
+        handler.ways = [i for i in handler.ways if handler.is_way_in_bbox(i)]
+
+    return handler
@@ -0,0 +1,368 @@
+import lzma
+import struct
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO, Deque, Dict, Iterable, Iterator, List, NamedTuple, \
+    Tuple, Type, Union
+
+from .compressed import open_decompressed
+
+if TYPE_CHECKING:
+    from .loader import LoadOptions, OSMLoader
+
+SUPPORTED_FEATURES = {"OsmSchema-V0.6", "DenseNodes"}
+
+PENDING_BLOBS_PER_JOB = 4
+"""How many blobs per process may be read ahead and decoded, but not yet consumed.
+Bounds the memory used by parallel decoding, regardless of the size of the file."""
+
+Tags = List[Tuple[str, str]]
+
+
+class NodeGroup(NamedTuple):
+    ids: "array[int]"
+    lats: "array[float]"
+    lons: "array[float]"
+    tags: Dict[int, Tags]
+    """Tags of nodes, by their index in the group. Untagged nodes are not present."""
+
+
+class WayGroup(NamedTuple):
+    ways: List[Tuple[int, "array[int]", Tags]]
+
+
+DecodedBlock = List[Union[NodeGroup, WayGroup]]
+
+
+# Protocol Buffers wire format
+
+def read_varint(buffer: bytes, position: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def iter_fields(buffer: bytes) -> Iterator[Tuple[int, Union[int, bytes]]]:
+    """Yields (field number, value) pairs of an encoded message.
+    Varints are returned as (unsigned) ints, length-delimited fields as bytes."""
+    position = 0
+    end = len(buffer)
+    while position < end:
+        key, position = read_varint(buffer, position)
+        field, wire_type = key >> 3, key & 7
+
+        if wire_type == 0:
+            value, position = read_varint(buffer, position)
+            yield field, value
+        elif wire_type == 2:
+            length, position = read_varint(buffer, position)
+            yield field, buffer[position:position + length]
+            position += length
+        elif wire_type == 1:
+            position += 8
+        elif wire_type == 5:
+            position += 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type: {wire_type}")
+
+
+def unpack_varints(buffer: bytes) -> List[int]:
+    values: List[int] = []
+    position = 0
+    end = len(buffer)
+    while position < end:
+        value, position = read_varint(buffer, position)
+        values.append(value)
+    return values
+
+
+def unpack_delta_sint(buffer: bytes) -> List[int]:
+    values: List[int] = []
+    current = 0
+    for raw in unpack_varints(buffer):
+        current += zigzag(raw)
+        values.append(current)
+    return values
+
+
+# File format
+
+def iter_blobs(stream: BinaryIO) -> Iterator[Tuple[str, bytes]]:
+    """Yields (type, encoded Blob message) pairs from a .osm.pbf file."""
+    while (size_bytes := stream.read(4)):
+        (header_size,) = struct.unpack(">I", size_bytes)
+        blob_type = ""
+        data_size = 0
+        for field, value in iter_fields(stream.read(header_size)):
+            if field == 1:
+                assert isinstance(value, bytes)
+                blob_type = value.decode("utf-8")
+            elif field == 3:
+                assert isinstance(value, int)
+                data_size = value
+        yield blob_type, stream.read(data_size)
+
+
+def decompress_blob(blob: bytes) -> bytes:
+    for field, value in iter_fields(blob):
+        assert isinstance(value, bytes) or field == 2
+        if field == 1:
+            return value  # type: ignore
+        elif field == 3:
+            return zlib.decompress(value)  # type: ignore
+        elif field == 4:
+            return lzma.decompress(value)  # type: ignore
+        elif field != 2:
+            raise ValueError(f"unsupported blob compression (field {field})")
+    raise ValueError("blob has no data")
+
+
+def check_header_block(data: bytes) -> None:
+    for field, value in iter_fields(data):
+        if field == 4:
+            assert isinstance(value, bytes)
+            feature = value.decode("utf-8")
+            if feature not in SUPPORTED_FEATURES:
+                raise ValueError(f"unsupported required PBF feature: {feature}")
+
+
+# PrimitiveBlock decoding
+
+def decode_tags(keys: List[int], values: List[int], strings: List[str]) -> Tags:
+    return [(strings[k], strings[v]) for k, v in zip(keys, values)]
+
+
+def decode_dense_nodes(data: bytes, strings: List[str], granularity: int, lat_offset: int,
+                       lon_offset: int) -> NodeGroup:
+    ids: List[int] = []
+    raw_lats: List[int] = []
+    raw_lons: List[int] = []
+    keys_vals: List[int] = []
+
+    for field, value in iter_fields(data):
+        assert isinstance(value, bytes)
+        if field == 1:
+            ids = unpack_delta_sint(value)
+        elif field == 8:
+            raw_lats = unpack_delta_sint(value)
+        elif field == 9:
+            raw_lons = unpack_delta_sint(value)
+        elif field == 10:
+            keys_vals = unpack_varints(value)
+
+    # keys_vals is a flat list of (key, value) string indices, with each node's list
+    # terminated by a 0. Without any tags in the block, the whole list is empty.
+    tags: Dict[int, Tags] = {}
+    node_index = 0
+    i = 0
+    while i < len(keys_vals):
+        key = keys_vals[i]
+        if key == 0:
+            node_index += 1
+            i += 1
+        else:
+            tags.setdefault(node_index, []).append((strings[key], strings[keys_vals[i + 1]]))
+            i += 2
+
+    # Division (rather than multiplication by 1e-9) of exact integers is correctly rounded,
+    # so coordinates match those parsed from the textual representation.
+    return NodeGroup(
+        ids=array("q", ids),
+        lats=array("d", ((lat_offset + granularity * i) / 1e9 for i in raw_lats)),
+        lons=array("d", ((lon_offset + granularity * i) / 1e9 for i in raw_lons)),
+        tags=tags,
+    )
+
+
+def decode_node(data: bytes, strings: List[str], granularity: int, lat_offset: int,
+                lon_offset: int) -> Tuple[int, float, float, Tags]:
+    node_id = 0
+    keys: List[int] = []
+    values: List[int] = []
+    lat = 0
+    lon = 0
+
+    for field, value in iter_fields(data):
+        if field == 1:
+            assert isinstance(value, int)
+            node_id = zigzag(value)
+        elif field == 2:
+            assert isinstance(value, bytes)
+            keys = unpack_varints(value)
+        elif field == 3:
+            assert isinstance(value, bytes)
+            values = unpack_varints(value)
+        elif field == 8:
+            assert isinstance(value, int)
+            lat = zigzag(value)
+        elif field == 9:
+            assert isinstance(value, int)
+            lon = zigzag(value)
+
+    return (
+        node_id,
+        (lat_offset + granularity * lat) / 1e9,
+        (lon_offset + granularity * lon) / 1e9,
+        decode_tags(keys, values, strings),
+    )
+
+
+def decode_way(data: bytes, strings: List[str]) -> Tuple[int, "array[int]", Tags]:
+    way_id = 0
+    keys: List[int] = []
+    values: List[int] = []
+    refs: List[int] = []
+
+    for field, value in iter_fields(data):
+        if field == 1:
+            assert isinstance(value, int)
+            way_id = value if value < (1 << 63) else value - (1 << 64)
+        elif field == 2:
+            assert isinstance(value, bytes)
+            keys = unpack_varints(value)
+        elif field == 3:
+            assert isinstance(value, bytes)
+            values = unpack_varints(value)
+        elif field == 8:
+            assert isinstance(value, bytes)
+            refs = unpack_delta_sint(value)
+
+    return way_id, array("q", refs), decode_tags(keys, values, strings)
+
+
+def decode_primitive_block(data: bytes) -> DecodedBlock:
+    strings: List[str] = []
+    raw_groups: List[bytes] = []
+    granularity = 100
+    lat_offset = 0
+    lon_offset = 0
+
+    for field, value in iter_fields(data):
+        if field == 1:
+            assert isinstance(value, bytes)
+            strings = [i.decode("utf-8") for _, i in iter_fields(value)]  # type: ignore
+        elif field == 2:
+            assert isinstance(value, bytes)
+            raw_groups.append(value)
+        elif field == 17:
+            assert isinstance(value, int)
+            granularity = value
+        elif field == 19:
+            assert isinstance(value, int)
+            lat_offset = value if value < (1 << 63) else value - (1 << 64)
+        elif field == 20:
+            assert isinstance(value, int)
+            lon_offset = value if value < (1 << 63) else value - (1 << 64)
+
+    groups: DecodedBlock = []
+    for raw_group in raw_groups:
+        simple_nodes: List[Tuple[int, float, float, Tags]] = []
+        ways: List[Tuple[int, "array[int]", Tags]] = []
+
+        for field, value in iter_fields(raw_group):
+            assert isinstance(value, bytes)
+            if field == 1:
+                simple_nodes.append(decode_node(value, strings, granularity, lat_offset,
+                                                lon_offset))
+            elif field == 2:
+                groups.append(decode_dense_nodes(value, strings, granularity, lat_offset,
+                                                 lon_offset))
+            elif field == 3:
+                ways.append(decode_way(value, strings))
+            # Relations and changesets are ignored
+
+        if simple_nodes:
+            groups.append(NodeGroup(
+                ids=array("q", (i[0] for i in simple_nodes)),
+                lats=array("d", (i[1] for i in simple_nodes)),
+                lons=array("d", (i[2] for i in simple_nodes)),
+                tags={idx: i[3] for idx, i in enumerate(simple_nodes) if i[3]},
+            ))
+
+        if ways:
+            groups.append(WayGroup(ways))
+
+    return groups
+
+
+def decode_blob(blob: bytes) -> DecodedBlock:
+    return decode_primitive_block(decompress_blob(blob))
+
+
+# Feeding the loader
+
+def feed_block(block: DecodedBlock, handler: "OSMLoader") -> None:
+    """Replays decoded entities through the same handler methods as the XML backends."""
+    for group in block:
+        if isinstance(group, NodeGroup):
+            for idx, (node_id, lat, lon) in enumerate(zip(group.ids, group.lats, group.lons)):
+                handler.start_node(str(node_id), lat, lon)
+                if handler.in_node:
+                    for key, value in group.tags.get(idx, ()):
+                        handler.node_tag(key, value)
+                handler.end_node()
+        else:
+            for way_id, refs, tags in group.ways:
+                handler.start_way(str(way_id))
+                if handler.in_way:
+                    for ref in refs:
+                        handler.way_node(ref)
+                    for key, value in tags:
+                        handler.way_tag(key, value)
+                handler.end_way()
+
+
+def iter_data_blobs(stream: BinaryIO) -> Iterator[bytes]:
+    for blob_type, blob in iter_blobs(stream):
+        if blob_type == "OSMHeader":
+            check_header_block(decompress_blob(blob))
+        elif blob_type == "OSMData":
+            yield blob
+
+
+def decode_blobs(blobs: Iterable[bytes], jobs: int) -> Iterator[DecodedBlock]:
+    """Decodes blobs in order. With jobs > 1, they are decoded in a pool of processes,
+    reading at most PENDING_BLOBS_PER_JOB blobs per process ahead of the consumer."""
+    if jobs <= 1:
+        yield from map(decode_blob, blobs)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: "Deque[Future[DecodedBlock]]" = deque()
+        for blob in blobs:
+            pending.append(executor.submit(decode_blob, blob))
+            if len(pending) >= jobs * PENDING_BLOBS_PER_JOB:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_blocks(path: str, jobs: int = 1) -> Iterator[DecodedBlock]:
+    """Yields decoded blocks of an .osm.pbf file, in file order."""
+    with open_decompressed(path) as stream:
+        yield from decode_blobs(iter_data_blobs(stream), jobs)
+
+
+def parse_pbf(loader: "Type[OSMLoader]", path: str, options: "LoadOptions", jobs: int = 1) \
+        -> "OSMLoader":
+    """Parses an .osm.pbf file, producing exactly the same data as the XML loader would.
+
+    Blocks are decompressed and decoded in a pool of `jobs` processes (if jobs > 1),
+    and fed to the loader in file order.
+    """
+    handler = loader(options)
+    for block in iter_blocks(path, jobs):
+        feed_block(block, handler)
+    return handler
@@ -0,0 +1,168 @@
+import multiprocessing
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .index import StationIndex
+from .loader import AnyPlatform, AnyStation, OSMLoader
+
+
+class Finding(NamedTuple):
+    """A single problem found by a rule."""
+    rule: str
+    """Name of the rule which produced the finding"""
+    subject: str
+    """What the finding is about - e.g. a station node id, or the duplicated value"""
+    issues: Tuple[str, ...] = ()
+    """Human-readable descriptions of the problem (may contain color codes)"""
+    stations: Tuple[AnyStation, ...] = ()
+    """Stations involved in the problem"""
+
+
+class Rule(ABC):
+    """Base class for checks run by `run_rules`.
+
+    Rules don't iterate over the data themselves - instead, the engine calls
+    `check_station` for every station and `check_platforms` for every group of platforms
+    (in the order of the input data), and `check_index` once all stations are indexed.
+    Rules which need lookups declare the StationIndex keys in `keys`, and the index
+    is shared between all rules.
+
+    Rules which need more data than stations and platforms (e.g. ways) get it
+    through `prepare`, and should check it in `check_index`. Incremental runs re-run
+    `check_index` after every change, unless the rule implements `check_changes`.
+    Anything expensive the rule computes from the data may be kept between runs
+    with `get_state` and `set_state`.
+    """
+    name: str = ""
+    title: str = ""
+    """Message printed before reporting the findings"""
+    success: str = ""
+    """Message printed if there are no findings"""
+    keys: Tuple[str, ...] = ()
+
+    def prepare(self, data: OSMLoader) -> None:
+        """Called with all of the loaded data before the checks are run."""
+        pass
+
+    def check_station(self, station: AnyStation) -> Iterable[Finding]:
+        return ()
+
+    def check_platforms(self, station_id: str, station: Optional[AnyStation],
+                        platforms: List[AnyPlatform]) -> Iterable[Finding]:
+        """Checks platforms referencing the provided station (None if no station
+        with such ref exists)."""
+        return ()
+
+    def check_index(self, index: StationIndex) -> Iterable[Finding]:
+        return ()
+
+    def check_changes(self, index: StationIndex, changed: Set[str],
+                      findings: List[Finding]) -> Optional[Iterable[Finding]]:
+        """Same as check_index, but given the `findings` of check_index before stations
+        with `changed` ids were added, removed or modified. Returns None if the findings
+        can't be updated incrementally, in which case check_index is run instead.
+
+        Only rules whose index findings depend on nothing but the stations
+        may implement it.
+        """
+        return None
+
+    def get_state(self) -> Any:
+        """Returns data computed by the rule which is worth keeping for the next run
+        (see set_state), e.g. in incremental snapshots."""
+        return None
+
+    def set_state(self, state: Any) -> None:
+        """Restores data returned by get_state, before `prepare` is called.
+        The rule has to check that it still applies to the prepared data."""
+        pass
+
+    @abstractmethod
+    def report(self, findings: Sequence[Finding]) -> None:
+        """Prints the findings of this rule."""
+        pass
+
+    def describe(self, finding: Finding) -> str:
+        """Returns a short, human-readable identification of a finding."""
+        return finding.subject
+
+
+def prepare_rules(rules: Iterable[Rule], data: OSMLoader) -> None:
+    for rule in rules:
+        rule.prepare(data)
+
+
+def index_keys(rules: Iterable[Rule]) -> Set[str]:
+    """Returns all StationIndex keys required by the rules. "ref" is always included,
+    as it is used to match platforms with their stations."""
+    keys = {"ref"}
+    for rule in rules:
+        keys.update(rule.keys)
+    return keys
+
+
+def run_rules(rules: Sequence[Rule], stations: Iterable[AnyStation],
+              platforms: Dict[str, List[AnyPlatform]]) -> Dict[str, List[Finding]]:
+    """Runs all rules in a single pass over stations and platforms.
+
+    Returns the findings grouped by rule names, in the order of `rules`. Within a rule,
+    findings from `check_station` come first, then from `check_platforms`
+    and lastly from `check_index`.
+    """
+    findings: Dict[str, List[Finding]] = {rule.name: [] for rule in rules}
+    index = StationIndex(keys=index_keys(rules))
+
+    for station in stations:
+        index.add(station)
+        for rule in rules:
+            findings[rule.name].extend(rule.check_station(station))
+
+    for station_id, group in platforms.items():
+        referenced = index.get("ref", station_id)
+        for rule in rules:
+            findings[rule.name].extend(rule.check_platforms(station_id, referenced, group))
+
+    for rule in rules:
+        findings[rule.name].extend(rule.check_index(index))
+
+    return findings
+
+
+_worker_data: Tuple[Sequence[Rule], List[AnyStation], Dict[str, List[AnyPlatform]]] = ((), [], {})
+"""Rules and data shared with run_rules_in_parallel workers"""
+
+
+def _init_worker(rules: Sequence[Rule], stations: List[AnyStation],
+                 platforms: Dict[str, List[AnyPlatform]]) -> None:
+    global _worker_data
+    _worker_data = rules, stations, platforms
+
+
+def _run_rule(rule_index: int) -> List[Finding]:
+    rules, stations, platforms = _worker_data
+    rule = rules[rule_index]
+    return run_rules([rule], stations, platforms)[rule.name]
+
+
+def run_rules_in_parallel(rules: Sequence[Rule], stations: Iterable[AnyStation],
+                          platforms: Dict[str, List[AnyPlatform]], jobs: int) \
+        -> Dict[str, List[Finding]]:
+    """Same as run_rules, but every rule is run separately in a pool of `jobs` processes.
+
+    The data is handed to the workers once, when they start. On Linux the workers are
+    forked, so they share the already loaded data instead of unpickling a copy.
+    Findings are merged in the order of `rules`, so the result is exactly the same
+    as of run_rules.
+    """
+    if jobs <= 1 or len(rules) <= 1:
+        return run_rules(rules, stations, platforms)
+
+    context: Any = multiprocessing.get_context("fork") if sys.platform == "linux" else None
+    with ProcessPoolExecutor(max_workers=min(jobs, len(rules)), mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(rules, list(stations), platforms)) as executor:
+        results = list(executor.map(_run_rule, range(len(rules))))
+
+    return {rule.name: findings for rule, findings in zip(rules, results)}
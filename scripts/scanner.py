@@ -0,0 +1,138 @@
+import io
+import mmap
+import re
+from typing import TYPE_CHECKING, BinaryIO, Union
+
+if TYPE_CHECKING:
+    from .loader import OSMLoader
+
+JOSM_HEADER = re.compile(
+    rb"<\?xml version='1\.0' encoding='UTF-8'\?>\s*<osm version='0\.6' generator='JOSM'[^>]*>"
+)
+
+# Every construct JOSM writes, with the capturing groups laid out so that
+# Match.lastindex identifies the matched alternative.
+TOKEN = re.compile(rb"""\s*(?:
+    <node\ id='(-?\d+)'[^>']*(?:'[^']*'[^>']*)*?\ lat='([^']*)'\ lon='([^']*)'\s*(/?)>  # 1-4
+  | <tag\ k='([^']*)'\ v='([^']*)'\s*/>                                               # 5-6
+  | (</node>)                                                                         # 7
+  | ((?:<nd\ ref='-?\d+'\s*/>\s*)+)                                                    # 8
+  | <way\ id='(-?\d+)'[^>']*(?:'[^']*'[^>']*)*?(/?)>                                  # 9-10
+  | (</way>)                                                                          # 11
+  | (</osm>)                                                                          # 12
+  | <bounds\ [^>]*/>
+)""", re.VERBOSE)
+
+TRAILER = re.compile(rb"\s*")
+ND_REF = re.compile(rb"ref='(-?\d+)'")
+
+ENTITY = re.compile(r"&(?:#x([0-9a-fA-F]+)|#([0-9]+)|(amp|lt|gt|quot|apos));")
+NAMED_ENTITIES = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+ATTRIBUTE_WHITESPACE = str.maketrans("\t\n\r", "   ")
+
+
+class LayoutError(ValueError):
+    """Raised when the file doesn't follow the exact layout written by JOSM."""
+    pass
+
+
+def decode_attribute(raw: bytes) -> str:
+    value = raw.decode("utf-8")
+    if "&" not in value and "\t" not in value and "\n" not in value and "\r" not in value:
+        return value
+
+    # Replicate XML attribute-value normalization: literal whitespace becomes
+    # a space, and then character references are expanded.
+    value = value.translate(ATTRIBUTE_WHITESPACE)
+    return ENTITY.sub(expand_entity, value)
+
+
+def expand_entity(match: "re.Match[str]") -> str:
+    hex_code, dec_code, name = match.groups()
+    if hex_code:
+        return chr(int(hex_code, 16))
+    elif dec_code:
+        return chr(int(dec_code))
+    return NAMED_ENTITIES[name]
+
+
+def scan(data: Union[bytes, "mmap.mmap"], handler: "OSMLoader") -> None:
+    """Feeds the handler with elements found by matching TOKEN one after another.
+
+    Only captured attribute values are ever decoded. Anything which isn't matched
+    by TOKEN (other XML constructs, double quotes, different attribute order...)
+    raises a LayoutError - there's no partial support.
+    """
+    header = JOSM_HEADER.match(data)
+    if header is None:
+        raise LayoutError("file doesn't start with the JOSM header")
+
+    position = header.end()
+    match_token = TOKEN.match
+    finished = False
+
+    while not finished:
+        token = match_token(data, position)
+        if token is None:
+            raise LayoutError(f"unexpected content at offset {position}")
+        position = token.end()
+        kind = token.lastindex
+
+        if kind == 6:
+            if handler.in_node:
+                handler.node_tag(decode_attribute(token[5]), decode_attribute(token[6]))
+            elif handler.in_way:
+                handler.way_tag(decode_attribute(token[5]), decode_attribute(token[6]))
+        elif kind == 8:
+            # Consecutive <nd> elements are matched at once
+            if handler.in_way:
+                for ref in ND_REF.findall(token[8]):
+                    handler.way_node(ref.decode("ascii"))
+        elif kind == 4:
+            handler.start_node(token[1].decode("ascii"), token[2].decode("ascii"),
+                               token[3].decode("ascii"))
+            if token[4]:
+                handler.end_node()
+        elif kind == 7:
+            handler.end_node()
+        elif kind == 10:
+            handler.start_way(token[9].decode("ascii"))
+            if token[10]:
+                handler.end_way()
+        elif kind == 11:
+            handler.end_way()
+        elif kind == 12:
+            finished = True
+
+    trailer = TRAILER.match(data, position)
+    if trailer is None or trailer.end() != len(data):
+        raise LayoutError("unexpected content after </osm>")
+
+
+def parse_scanner(stream: BinaryIO, handler: "OSMLoader") -> None:
+    """Parses a JOSM-written OSM file with byte-level regular expressions
+    over a memory-mapped file, skipping the XML parser altogether.
+
+    Streams which aren't plain files (e.g. decompressing ones) are read into memory
+    instead of being memory-mapped.
+
+    If the file doesn't have the expected layout, the handler is reset
+    and the file is parsed with the regular SAX backend instead.
+    """
+    from .loader import parse_sax
+
+    try:
+        if isinstance(stream, (io.BufferedReader, io.FileIO)):
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                scan(mapped, handler)
+        else:
+            buffer = stream.read()
+            stream = io.BytesIO(buffer)
+            scan(buffer, handler)
+
+    except LayoutError:
+        check_way_bbox = handler.check_way_bbox
+        handler.__init__(handler.options)  # type: ignore
+        handler.check_way_bbox = check_way_bbox
+        stream.seek(0)
+        parse_sax(stream, handler)
@@ -0,0 +1,274 @@
+import math
+from array import array
+from typing import Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+from .util import EARTH_RADIUS, Position, distance
+
+T = TypeVar("T")
+
+DEFAULT_CELL_SIZE = 5000.0
+"""Default size of grid cells, in meters."""
+
+
+DEFAULT_SEGMENT_CELL_SIZE = 1000.0
+"""Default size of grid cells of SegmentIndex, in meters."""
+
+Segment = Tuple[Position, Position]
+
+
+def get_position(item: T) -> Position:
+    return item.position  # type: ignore
+
+
+def bounding_box(position: Position, radius: float) \
+        -> Optional[Tuple[float, float, float, float]]:
+    """Returns the (min_lat, min_lon, max_lat, max_lon) bounding box of all points
+    at most `radius` meters away from the position, or None if it would contain a pole."""
+    lat, lon = position
+    angular_radius = radius / EARTH_RADIUS
+    delta_lat = math.degrees(angular_radius)
+
+    # Longitude bounds of a spherical cap, see
+    # http://janmatuschek.de/LatitudeLongitudeBoundingCoordinates
+    min_lat = lat - delta_lat
+    max_lat = lat + delta_lat
+    sin_ratio = math.sin(angular_radius) / math.cos(math.radians(lat)) \
+        if angular_radius < math.pi / 2 and max_lat < 90.0 and min_lat > -90.0 else 2.0
+    if sin_ratio >= 1.0:
+        return None
+
+    delta_lon = math.degrees(math.asin(sin_ratio))
+    return min_lat, lon - delta_lon, max_lat, lon + delta_lon
+
+
+def segment_distance(position: Position, start: Position, end: Position) -> float:
+    """Calculates the distance (in meters) from a position to the closest point of a segment.
+
+    The segment is projected onto a plane tangent at the position (like
+    util.equirectangular_distance), so the result is accurate for segments up to
+    a few kilometers long and away - see util.EQUIRECTANGULAR_MAX_ERROR.
+    """
+    lat, lon = map(math.radians, position)
+    cos_lat = math.cos(lat)
+    ax = (math.radians(start[1]) - lon) * cos_lat
+    ay = math.radians(start[0]) - lat
+    dx = (math.radians(end[1]) - lon) * cos_lat - ax
+    dy = math.radians(end[0]) - lat - ay
+
+    length_squared = dx * dx + dy * dy
+    t = 0.0 if length_squared == 0.0 else min(max(-(ax * dx + ay * dy) / length_squared, 0.0), 1.0)
+    return math.hypot(ax + t * dx, ay + t * dy) * EARTH_RADIUS
+
+
+class PointIndex(Generic[T]):
+    """Uniform grid over items with positions (e.g. stations or platforms),
+    answering nearest-neighbour, radius and bounding box queries.
+
+    The grid is laid out in an equirectangular projection around the mean latitude
+    of the items, so that cells are roughly `cell_size` meters squares. Candidate cells
+    are selected with conservative bounds, and all returned distances are exact
+    haversine distances (util.distance) - results are the same as of a linear scan.
+    """
+
+    def __init__(self, items: Iterable[T], position: Callable[[T], Position] = get_position,
+                 cell_size: float = DEFAULT_CELL_SIZE) -> None:
+        self.items: List[T] = list(items)
+        self.cell_size = cell_size
+        self.lats = array("d")
+        self.lons = array("d")
+        for item in self.items:
+            lat, lon = position(item)
+            self.lats.append(lat)
+            self.lons.append(lon)
+
+        reference_lat = sum(self.lats) / len(self.lats) if self.lats else 0.0
+        self.cell_lat = math.degrees(cell_size / EARTH_RADIUS)
+        self.cell_lon = self.cell_lat / math.cos(math.radians(reference_lat))
+
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for idx, (lat, lon) in enumerate(zip(self.lats, self.lons)):
+            self.cells.setdefault(self.cell_of(lat, lon), []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+    def candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) \
+            -> List[int]:
+        """Returns indices of items in cells overlapping the bounding box."""
+        min_row, min_col = self.cell_of(min_lat, min_lon)
+        max_row, max_col = self.cell_of(max_lat, max_lon)
+
+        # Iterate over the smaller of: cells in the box, or all non-empty cells
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            return [
+                idx
+                for (row, col), indices in self.cells.items()
+                if min_row <= row <= max_row and min_col <= col <= max_col
+                for idx in indices
+            ]
+
+        found: List[int] = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                found.extend(self.cells.get((row, col), ()))
+        return found
+
+    def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) \
+            -> List[T]:
+        """Returns all items inside of the bounding box (in the order of insertion)."""
+        return [
+            self.items[idx]
+            for idx in sorted(self.candidates(min_lat, min_lon, max_lat, max_lon))
+            if min_lat <= self.lats[idx] <= max_lat and min_lon <= self.lons[idx] <= max_lon
+        ]
+
+    def within(self, position: Position, radius: float) -> List[Tuple[float, T]]:
+        """Returns (distance, item) pairs of all items at most `radius` meters away
+        from the position, sorted by distance (ties broken by the order of insertion)."""
+        bbox = bounding_box(position, radius)
+        candidates = self.candidates(*bbox) if bbox else list(range(len(self.items)))
+
+        found: List[Tuple[float, int]] = []
+        for idx in candidates:
+            dist = distance(position, (self.lats[idx], self.lons[idx]))
+            if dist <= radius:
+                found.append((dist, idx))
+
+        found.sort()
+        return [(dist, self.items[idx]) for dist, idx in found]
+
+    def nearest(self, position: Position, k: int = 1, max_distance: Optional[float] = None) \
+            -> List[Tuple[float, T]]:
+        """Returns (distance, item) pairs of the `k` items closest to the position
+        (optionally, at most `max_distance` meters away), sorted by distance."""
+        if k <= 0 or not self.items:
+            return []
+
+        # Search in growing circles; once at least k items are found within a radius,
+        # no item outside of it can be closer.
+        radius = self.cell_size
+        limit = max_distance if max_distance is not None else math.pi * EARTH_RADIUS
+        while True:
+            radius = min(radius, limit)
+            found = self.within(position, radius)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius *= 2
+
+
+class SegmentIndex:
+    """Uniform grid over line segments (e.g. of rail ways), answering
+    nearest-segment queries.
+
+    Every segment is put into all cells overlapping with its bounding box, in the same
+    equirectangular grid as PointIndex. Distances are calculated like in `segment_distance`,
+    but with the ends of segments converted to radians once, when the index is built.
+    """
+
+    def __init__(self, segments: Iterable[Segment],
+                 cell_size: float = DEFAULT_SEGMENT_CELL_SIZE) -> None:
+        self.segments: List[Segment] = list(segments)
+        self.cell_size = cell_size
+
+        lats = [lat for segment in self.segments for lat, _ in segment]
+        reference_lat = sum(lats) / len(lats) if lats else 0.0
+        self.cell_lat = math.degrees(cell_size / EARTH_RADIUS)
+        self.cell_lon = self.cell_lat / math.cos(math.radians(reference_lat))
+
+        radians = math.radians
+        self.start_lats = array("d", [radians(start[0]) for start, _ in self.segments])
+        self.start_lons = array("d", [radians(start[1]) for start, _ in self.segments])
+        self.end_lats = array("d", [radians(end[0]) for _, end in self.segments])
+        self.end_lons = array("d", [radians(end[1]) for _, end in self.segments])
+
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        floor = math.floor
+        for idx, ((lat1, lon1), (lat2, lon2)) in enumerate(self.segments):
+            row1, col1 = floor(lat1 / self.cell_lat), floor(lon1 / self.cell_lon)
+            row2, col2 = floor(lat2 / self.cell_lat), floor(lon2 / self.cell_lon)
+            if row1 == row2 and col1 == col2:
+                # Most segments are much shorter than cells
+                self.cells.setdefault((row1, col1), []).append(idx)
+                continue
+            for row in range(min(row1, row2), max(row1, row2) + 1):
+                for col in range(min(col1, col2), max(col1, col2) + 1):
+                    self.cells.setdefault((row, col), []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+    def candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) \
+            -> List[int]:
+        """Returns indices of segments in cells overlapping the bounding box.
+        Segments spanning several cells may be returned more than once."""
+        min_row, min_col = self.cell_of(min_lat, min_lon)
+        max_row, max_col = self.cell_of(max_lat, max_lon)
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            return [
+                idx
+                for (row, col), indices in self.cells.items()
+                if min_row <= row <= max_row and min_col <= col <= max_col
+                for idx in indices
+            ]
+
+        found: List[int] = []
+        get_cell = self.cells.get
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                found.extend(get_cell((row, col), ()))
+        return found
+
+    def closest(self, position: Position, candidates: Iterable[int]) \
+            -> Optional[Tuple[float, int]]:
+        """Returns the (distance, index) pair of the candidate segment closest
+        to the position (ties broken by lower indices), or None if there are no candidates.
+        Distances are exactly the same as of `segment_distance`."""
+        lat, lon = map(math.radians, position)
+        cos_lat = math.cos(lat)
+        start_lats, start_lons = self.start_lats, self.start_lons
+        end_lats, end_lons = self.end_lats, self.end_lons
+        hypot = math.hypot
+
+        best: Optional[Tuple[float, int]] = None
+        for idx in candidates:
+            ax = (start_lons[idx] - lon) * cos_lat
+            ay = start_lats[idx] - lat
+            dx = (end_lons[idx] - lon) * cos_lat - ax
+            dy = end_lats[idx] - lat - ay
+
+            length_squared = dx * dx + dy * dy
+            t = 0.0 if length_squared == 0.0 else -(ax * dx + ay * dy) / length_squared
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            dist = hypot(ax + t * dx, ay + t * dy) * EARTH_RADIUS
+            if best is None or (dist, idx) < best:
+                best = dist, idx
+        return best
+
+    def nearest(self, position: Position, max_distance: Optional[float] = None) \
+            -> Optional[Tuple[float, Segment]]:
+        """Returns the (distance, segment) pair of the segment closest to the position
+        (optionally, at most `max_distance` meters away), or None if there's no such segment."""
+        if not self.segments:
+            return None
+
+        # Search in growing boxes; once a segment is found within the radius,
+        # no segment outside of the radius' bounding box can be closer.
+        radius = self.cell_size
+        limit = max_distance if max_distance is not None else math.pi * EARTH_RADIUS
+        while True:
+            radius = min(radius, limit)
+            bbox = bounding_box(position, radius)
+            best = self.closest(position,
+                                self.candidates(*bbox) if bbox else range(len(self.segments)))
+            if best is not None and best[0] <= radius:
+                return best[0], self.segments[best[1]]
+            elif radius >= limit:
+                return None
+            radius *= 2
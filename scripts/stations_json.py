@@ -1,12 +1,13 @@
 import json
+from argparse import ArgumentParser
 from typing import Any, Dict, Iterable, List
 import sys
 
-from .loader import Station, Platform, OSMLoader
+from .loader import AnyPlatform, AnyStation, add_loader_arguments, load_from_args
 from .util import osm_list
 
 
-def stations_to_json(raw_stations: Iterable[Station]) -> Dict[str, Dict[str, Any]]:
+def stations_to_json(raw_stations: Iterable[AnyStation]) -> Dict[str, Dict[str, Any]]:
     json_stations: Dict[str, Dict[str, Any]] = {}
 
     for raw_station in raw_stations:
@@ -37,7 +38,7 @@ def stations_to_json(raw_stations: Iterable[Station]) -> Dict[str, Dict[str, Any
 
 
 def platforms_to_json(json_stations: Dict[str, Dict[str, Any]],
-                      raw_platforms: Dict[str, List[Platform]]) -> None:
+                      raw_platforms: Dict[str, List[AnyPlatform]]) -> None:
     for station_id, platforms in raw_platforms.items():
         if platforms:
             json_stations[station_id]["platforms"] = []
@@ -64,7 +65,11 @@ def platforms_to_json(json_stations: Dict[str, Dict[str, Any]],
 
 
 if __name__ == "__main__":
-    data = OSMLoader.load_all("plrailmap.osm")
+    argument_parser = ArgumentParser()
+    add_loader_arguments(argument_parser)
+    args = argument_parser.parse_args()
+
+    data = load_from_args(args)
     stations_json = stations_to_json(data.stations)
     platforms_to_json(stations_json, data.platforms)
     json.dump(stations_json, sys.stdout, indent=2, ensure_ascii=False)
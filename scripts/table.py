@@ -0,0 +1,146 @@
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, overload
+
+from .loader import AnyStation, Station
+from .util import from_fixed_point, to_fixed_point
+
+COLUMN_TAGS = frozenset({"_id", "name", "ref", "ref:ibnr", "railway"})
+"""Tags stored in dedicated columns (or implied, like railway=station), and thus
+not repeated in the rare tags table."""
+
+
+class StationRow:
+    """Read-only view of a single row of a StationTable, with the same attributes as Station.
+
+    No data is copied when creating the view - attributes are read from the table's columns.
+    Only `other_tags` has to be assembled on each access.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "StationTable", index: int) -> None:
+        self.table = table
+        self.index = index
+
+    @property
+    def id(self) -> str:
+        return self.table.ids[self.index]
+
+    @property
+    def name(self) -> str:
+        return self.table.names[self.index]
+
+    @property
+    def pkpplk(self) -> str:
+        return self.table.pkpplk[self.index]
+
+    @property
+    def ibnr(self) -> Optional[str]:
+        return self.table.ibnr[self.index]
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        return self.table.position(self.index)
+
+    @property
+    def other_tags(self) -> Dict[str, str]:
+        return self.table.other_tags(self.index)
+
+    def to_station(self) -> Station:
+        return Station(self.id, self.name, self.pkpplk, self.ibnr, self.position,
+                       self.other_tags)
+
+    def __repr__(self) -> str:
+        return f"StationRow({self.index}, id={self.id!r}, name={self.name!r})"
+
+
+class StationTable:
+    """Columnar (struct-of-arrays) storage of stations.
+
+    Positions are kept in two array("d") columns (which can be wrapped by numpy.frombuffer
+    without copying), codes and names in lists of interned strings, and all other tags
+    in a sparse table: tag key → row index → value.
+
+    With `fixed_point` set, positions are kept as int32 multiples of 1e-7 degrees
+    (see util.FIXED_POINT_SCALE), and converted to floats on access.
+    """
+
+    def __init__(self, fixed_point: bool = False) -> None:
+        self.fixed_point = fixed_point
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.pkpplk: List[str] = []
+        self.ibnr: List[Optional[str]] = []
+        self.lats: "array[Any]" = array("i" if fixed_point else "d")
+        self.lons: "array[Any]" = array("i" if fixed_point else "d")
+        self.rare_tags: Dict[str, Dict[int, str]] = {}
+
+    @classmethod
+    def from_stations(cls, stations: Iterable[AnyStation], fixed_point: bool = False) \
+            -> "StationTable":
+        table = cls(fixed_point)
+        for station in stations:
+            table.append(station)
+        return table
+
+    def append(self, station: AnyStation) -> None:
+        index = len(self.ids)
+        self.ids.append(station.id)
+        self.names.append(sys.intern(station.name))
+        self.pkpplk.append(sys.intern(station.pkpplk))
+        self.ibnr.append(sys.intern(station.ibnr) if station.ibnr is not None else None)
+        if self.fixed_point:
+            self.lats.append(to_fixed_point(station.position[0]))
+            self.lons.append(to_fixed_point(station.position[1]))
+        else:
+            self.lats.append(station.position[0])
+            self.lons.append(station.position[1])
+
+        for key, value in station.other_tags.items():
+            if key not in COLUMN_TAGS:
+                self.rare_tags.setdefault(sys.intern(key), {})[index] = sys.intern(value)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @overload
+    def __getitem__(self, index: int) -> StationRow: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[StationRow]: ...
+
+    def __getitem__(self, index):  # type: ignore
+        if isinstance(index, slice):
+            return [StationRow(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return StationRow(self, index)
+
+    def __iter__(self) -> Iterator[StationRow]:
+        return (StationRow(self, i) for i in range(len(self)))
+
+    def position(self, index: int) -> Tuple[float, float]:
+        if self.fixed_point:
+            return from_fixed_point(self.lats[index]), from_fixed_point(self.lons[index])
+        return self.lats[index], self.lons[index]
+
+    def tag(self, index: int, key: str) -> Optional[str]:
+        """Returns the value of a rare tag of a given row, without assembling other_tags."""
+        column = self.rare_tags.get(key)
+        return column.get(index) if column is not None else None
+
+    def other_tags(self, index: int) -> Dict[str, str]:
+        """Re-creates the other_tags dictionary of a given row, as produced by OSMLoader."""
+        tags = {"_id": self.ids[index], "name": self.names[index], "railway": "station",
+                "ref": self.pkpplk[index]}
+        if (ibnr := self.ibnr[index]) is not None:
+            tags["ref:ibnr"] = ibnr
+        for key, column in self.rare_tags.items():
+            if (value := column.get(index)) is not None:
+                tags[key] = value
+        return tags
+
+    def to_stations(self) -> List[Station]:
+        return [row.to_station() for row in self]
@@ -1,9 +1,43 @@
 import math
-from typing import Callable, Dict, Iterable, List, Tuple, TypeVar
+from array import array
+from functools import lru_cache
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple,
+                    TypeVar)
 
 K = TypeVar("K")
 V = TypeVar("V")
 
+Position = Tuple[float, float]
+
+EARTH_RADIUS = 6364858.7
+"""Radius (in meters) of the WGS 84 ellipsoid at the center of Poland, see `distance`."""
+
+FIXED_POINT_SCALE = 10_000_000
+"""Fixed-point coordinates are stored in units of 1e-7 degrees, like in OSM's own database.
+This gives ~1 cm resolution, and all valid coordinates fit in an int32."""
+
+EQUIRECTANGULAR_LATITUDES = (48.0, 56.0)
+"""Range of latitudes (in degrees, covering Poland with a margin) in which
+EQUIRECTANGULAR_MAX_ERROR holds."""
+
+EQUIRECTANGULAR_RANGE = 10_000.0
+"""Maximum distance (in meters) for which EQUIRECTANGULAR_MAX_ERROR holds."""
+
+EQUIRECTANGULAR_MAX_ERROR = 1e-6
+"""Maximum relative error of `equirectangular_distance` compared to `distance`,
+for points in EQUIRECTANGULAR_LATITUDES at most EQUIRECTANGULAR_RANGE apart.
+
+The error grows with the square of the distance; a sweep over the latitude range
+in all directions gives at most 2.8e-9 at 1 km and 2.8e-7 at 10 km (~3 mm)."""
+
+# Constants of the fast path of is_within_distance
+_MIN_LAT, _MAX_LAT = EQUIRECTANGULAR_LATITUDES
+_HALF_DEGREE = math.radians(0.5)
+_SQUARED_METERS_PER_DEGREE = (math.radians(1.0) * EARTH_RADIUS) ** 2
+_SQUARED_RANGE = EQUIRECTANGULAR_RANGE ** 2
+_SQUARED_LOWER_MARGIN = (1.0 - EQUIRECTANGULAR_MAX_ERROR) ** 2
+_SQUARED_UPPER_MARGIN = (1.0 + EQUIRECTANGULAR_MAX_ERROR) ** 2
+
 
 def group_by(iterable: Iterable[V], key: Callable[[V], K]) -> Dict[K, List[V]]:
     grouped: Dict[K, List[V]] = {}
@@ -16,7 +50,17 @@ def osm_list(value: str) -> List[str]:
     return value.split(";") if value else []
 
 
-def distance(n1: Tuple[float, float], n2: Tuple[float, float]) -> float:
+def to_fixed_point(degrees: float) -> int:
+    return round(degrees * FIXED_POINT_SCALE)
+
+
+def from_fixed_point(value: int) -> float:
+    # Division of exact integers is correctly rounded, so values with at most 7 decimal
+    # places are converted to exactly the same float as when parsed from text.
+    return value / FIXED_POINT_SCALE
+
+
+def distance(n1: Position, n2: Position) -> float:
     """Calculates the distance between two positions (in meters) using the haversine formula.
 
     The radius used for calculations is taken from the WGS 84 ellipsoid
@@ -35,4 +79,166 @@ def distance(n1: Tuple[float, float], n2: Tuple[float, float]) -> float:
         + (math.cos(lat1) * math.cos(lat2) * (math.sin(delta_lon_half) ** 2))
     )
 
-    return math.asin(sqrt_h) * 2.0 * 6364858.7
+    return math.asin(sqrt_h) * 2.0 * EARTH_RADIUS
+
+
+def equirectangular_distance(n1: Position, n2: Position) -> float:
+    """Approximates the distance between two positions (in meters) by projecting them
+    onto a plane tangent at their mean latitude. Needs only a single trigonometric call.
+
+    See EQUIRECTANGULAR_MAX_ERROR for the accuracy in Poland.
+    """
+    lat1, lon1 = map(math.radians, n1)
+    lat2, lon2 = map(math.radians, n2)
+    x = (lon2 - lon1) * math.cos((lat1 + lat2) * 0.5)
+    y = lat2 - lat1
+    return math.sqrt(x * x + y * y) * EARTH_RADIUS
+
+
+def is_within_distance(n1: Position, n2: Position, limit: float, fast: bool = False) -> bool:
+    """Checks whether `distance(n1, n2) <= limit` (False if any of the positions is NaN).
+
+    With `fast` set, the squared equirectangular distance (in degrees, scaled to meters) is
+    compared against the squared limit first - which skips the conversions to radians, square
+    roots and all trigonometric calls but one. The haversine formula is used only if that's
+    inconclusive: within EQUIRECTANGULAR_MAX_ERROR of the limit, further apart than
+    EQUIRECTANGULAR_RANGE or outside of EQUIRECTANGULAR_LATITUDES.
+    The result is always the same as without `fast`.
+    """
+    if fast and limit >= 0.0:
+        lat1, lon1 = n1
+        lat2, lon2 = n2
+        if _MIN_LAT <= lat1 <= _MAX_LAT and _MIN_LAT <= lat2 <= _MAX_LAT:
+            x = (lon2 - lon1) * math.cos((lat1 + lat2) * _HALF_DEGREE)
+            y = lat2 - lat1
+            estimate = (x * x + y * y) * _SQUARED_METERS_PER_DEGREE
+            squared_limit = limit * limit
+            if estimate <= _SQUARED_RANGE:
+                if estimate < squared_limit * _SQUARED_LOWER_MARGIN:
+                    return True
+                elif estimate > squared_limit * _SQUARED_UPPER_MARGIN:
+                    return False
+    return distance(n1, n2) <= limit
+
+
+# Batch distance calculations.
+#
+# With NumPy installed, those are vectorized and return NumPy arrays. NumPy's trigonometric
+# functions may differ from the math module's by an ulp, so results are equal to `distance`
+# up to floating-point rounding.
+#
+# Without NumPy (or with USE_NUMPY switched off), array("d") objects are returned,
+# and the computations are bit-for-bit identical to `distance` - only the radians and cosines
+# of each position are computed once, instead of once per pair.
+
+USE_NUMPY = True
+"""Whether the batch functions may use NumPy, if it's installed."""
+
+
+@lru_cache(maxsize=None)
+def import_numpy() -> Any:
+    # NumPy takes longer to import than most scripts need for all of their work,
+    # so it's only imported once a batch function is called.
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        return None
+    return numpy
+
+
+def get_numpy() -> Any:
+    """Returns the numpy module, or None if it's not installed or USE_NUMPY is off."""
+    return import_numpy() if USE_NUMPY else None
+
+
+def distances(a: Sequence[Position], b: Sequence[Position]) -> Sequence[float]:
+    """Calculates distances (in meters) between a[i] and b[i], for every i."""
+    if len(a) != len(b):
+        raise ValueError("distances requires sequences of equal length")
+
+    numpy = get_numpy()
+    if numpy is not None:
+        return _numpy_haversine(numpy.radians(numpy.asarray(a, dtype=float).reshape(-1, 2)),
+                                numpy.radians(numpy.asarray(b, dtype=float).reshape(-1, 2)))
+
+    return array("d", map(distance, a, b))
+
+
+def distances_from(origin: Position, points: Sequence[Position]) -> Sequence[float]:
+    """Calculates distances (in meters) from the origin to every point."""
+    numpy = get_numpy()
+    if numpy is not None:
+        return _numpy_haversine(numpy.radians(numpy.asarray(origin, dtype=float).reshape(1, 2)),
+                                numpy.radians(numpy.asarray(points, dtype=float).reshape(-1, 2)))
+
+    lat1, lon1 = map(math.radians, origin)
+    cos_lat1 = math.cos(lat1)
+    return array("d", (_haversine_prepared(lat1, lon1, cos_lat1, *_prepare(i)) for i in points))
+
+
+def iter_distance_matrix(a: Sequence[Position], b: Sequence[Position],
+                         block_size: int = 1024) -> Iterator[Tuple[int, Any]]:
+    """Calculates distances (in meters) between every position from `a` and every position
+    from `b`, in blocks of at most `block_size` rows (positions from `a`).
+
+    Yields (index of the first row, block) pairs, where block is a 2D NumPy array,
+    or a list of array("d") rows. Only a single block is kept in memory at once.
+    """
+    numpy = get_numpy()
+    if numpy is not None:
+        a_rad = numpy.radians(numpy.asarray(a, dtype=float).reshape(-1, 2))
+        b_rad = numpy.radians(numpy.asarray(b, dtype=float).reshape(-1, 2))
+        for start in range(0, len(a_rad), block_size):
+            yield start, _numpy_haversine(a_rad[start:start + block_size, numpy.newaxis, :],
+                                          b_rad[numpy.newaxis, :, :])
+        return
+
+    b_prepared = [_prepare(i) for i in b]
+    for start in range(0, len(a), block_size):
+        block: List["array[float]"] = []
+        for origin in a[start:start + block_size]:
+            lat1, lon1, cos_lat1 = _prepare(origin)
+            block.append(array("d", (_haversine_prepared(lat1, lon1, cos_lat1, *i)
+                                     for i in b_prepared)))
+        yield start, block
+
+
+def distance_matrix(a: Sequence[Position], b: Sequence[Position],
+                    block_size: int = 1024) -> Any:
+    """Calculates distances (in meters) between every position from `a` and every position
+    from `b`, returning a len(a)×len(b) 2D NumPy array or a list of array("d") rows."""
+    blocks = [block for _, block in iter_distance_matrix(a, b, block_size)]
+    numpy = get_numpy()
+    if numpy is not None:
+        return numpy.concatenate(blocks) if blocks else numpy.empty((0, len(b)))
+    return [row for block in blocks for row in block]
+
+
+def _prepare(position: Position) -> Tuple[float, float, float]:
+    lat, lon = map(math.radians, position)
+    return lat, lon, math.cos(lat)
+
+
+def _haversine_prepared(lat1: float, lon1: float, cos_lat1: float, lat2: float, lon2: float,
+                        cos_lat2: float) -> float:
+    # Same operations, in the same order, as in `distance`
+    delta_lat_half = (lat2 - lat1) * 0.5
+    delta_lon_half = (lon2 - lon1) * 0.5
+    sqrt_h = math.sqrt(
+        (math.sin(delta_lat_half) ** 2)
+        + (cos_lat1 * cos_lat2 * (math.sin(delta_lon_half) ** 2))
+    )
+    return math.asin(sqrt_h) * 2.0 * EARTH_RADIUS
+
+
+def _numpy_haversine(a_rad: Any, b_rad: Any) -> Any:
+    numpy = import_numpy()
+    lat1 = a_rad[..., 0]
+    lat2 = b_rad[..., 0]
+    delta_lat_half = (lat2 - lat1) * 0.5
+    delta_lon_half = (b_rad[..., 1] - a_rad[..., 1]) * 0.5
+    sqrt_h = numpy.sqrt(
+        numpy.sin(delta_lat_half) ** 2
+        + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin(delta_lon_half) ** 2
+    )
+    return numpy.arcsin(sqrt_h) * 2.0 * EARTH_RADIUS
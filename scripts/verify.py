@@ -1,18 +1,47 @@
 # cSpell: words ztmw
-import math
+import hashlib
+import os
 import re
 import sys
-from collections import Counter, defaultdict
+import time
+from argparse import ArgumentParser
+from array import array
+from collections import Counter
 from itertools import chain
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, \
+    Sequence, Set, Tuple
 
-from .loader import OSMLoader, Platform, Station
-from .util import distance, group_by, osm_list
+from .fuzzy import TrigramIndex, dice, name_trigrams, normalize_name
+from .incremental import Snapshot, full_snapshot, run_rules_incrementally, update_snapshot
+from .index import StationIndex
+from .loader import AnyPlatform, AnyStation, OSMLoader, add_loader_arguments, load_from_args
+from .rules import Finding, Rule, prepare_rules, run_rules_in_parallel
+from .spatial import PointIndex, Segment, SegmentIndex, bounding_box
+from .util import distance, group_by, is_within_distance, osm_list
 
 ID_WIDTH = 8
 IBNR_WIDTH = 4
 PKPPLK_WIDTH = 6
 
+NEAR_DUPLICATE_DISTANCE = 50.0
+"""Default distance (in meters) below which stations are reported as near-duplicates."""
+
+FUZZY_NAME_SIMILARITY = 0.9
+"""Default similarity (Dice coefficient of name trigrams) from which station names
+are reported as near-duplicates. Distinct stations currently reach up to ~0.87
+(e.g. "Głogów Małopolski" and "Głogów Małopolski Niwa")."""
+
+RAIL_DISTANCE = 200.0
+"""Default distance (in meters) from the nearest rail above which stations
+and platforms are reported."""
+
+RAIL_COVERAGE = 2000.0
+"""Stations and platforms further than this (in meters) from any rail are assumed
+to be in areas where rails aren't drawn yet, and aren't reported."""
+
+WATCH_INTERVAL = 0.1
+"""How often (in seconds) the OSM file is checked for changes in the watch mode."""
+
 HEADING_HINTS = {"N", "NE", "E", "SE", "S", "SW", "W", "NW"}
 VALID_HINTS = {"*", "T"} | HEADING_HINTS
 
@@ -37,7 +66,7 @@ class Color:
     on_prev_line = "\x1B[F\x1B[K"
 
 
-def print_station(station: Station, which_col_blue: Optional[int] = None):
+def print_station(station: AnyStation, which_col_blue: Optional[int] = None):
     fields = [
         station.id.ljust(ID_WIDTH),
         station.pkpplk.ljust(PKPPLK_WIDTH),
@@ -51,85 +80,231 @@ def print_station(station: Station, which_col_blue: Optional[int] = None):
     print("\t".join(fields))
 
 
-def verify_uniq_pkpplk(stations: List[Station]) -> bool:
-    stations_by_pkpplk: defaultdict[str, List[Station]] = defaultdict(list)
-    ok: bool = True
-
-    print(f"{Color.dim}Checking uniqueness of PKP PLK IDs{Color.reset}")
-
-    for station in stations:
-        stations_by_pkpplk[station.pkpplk].append(station)
-
-    for invalid_group in filter(lambda stations: len(stations) > 1, stations_by_pkpplk.values()):
-        if ok:
-            ok = False
-            print(f"{Color.on_prev_line}❌ {Color.red}Found duplicate PKP PLK ids:{Color.reset}")
-            print("\t".join(FIELDS))
-
-        for station in invalid_group:
-            print_station(station, 1)
-
-    if ok:
-        print(f"{Color.on_prev_line}✅ {Color.green}PKP PLK ids are unique{Color.reset}")
-
-    return ok
+class UniquenessRule(Rule):
+    """Ensures that no 2 stations share the same value of an indexed key."""
 
+    def __init__(self, name: str, key: str, column: int, title: str, failure: str,
+                 success: str) -> None:
+        self.name = name
+        self.keys = (key,)
+        self.column = column
+        """Column of print_station to highlight"""
+        self.title = title
+        self.failure = failure
+        self.success = success
 
-def verify_uniq_names(stations: List[Station]) -> bool:
-    stations_by_name: defaultdict[str, List[Station]] = defaultdict(list)
-    ok: bool = True
+    def check_index(self, index: StationIndex) -> Iterable[Finding]:
+        for value, stations in index.by_key[self.keys[0]].items():
+            if len(stations) > 1:
+                yield Finding(self.name, value, stations=tuple(stations))
 
-    print(f"{Color.dim}Checking uniqueness of names{Color.reset}")
+    def report(self, findings: Sequence[Finding]) -> None:
+        print(f"{Color.dim}{self.title}{Color.reset}")
 
-    for station in stations:
-        stations_by_name[station.name].append(station)
-
-    for invalid_group in filter(lambda stations: len(stations) > 1, stations_by_name.values()):
-        if ok:
-            ok = False
-            print(f"{Color.on_prev_line}❌ {Color.red}Found duplicate names:{Color.reset}")
+        if findings:
+            print(f"{Color.on_prev_line}❌ {Color.red}{self.failure}{Color.reset}")
             print("\t".join(FIELDS))
-
-        for station in invalid_group:
-            print_station(station, 3)
-
-    if ok:
-        print(f"{Color.on_prev_line}✅ {Color.green}Station names are unique{Color.reset}")
-
-    return ok
-
-
-def verify_uniq_ibnr(stations: List[Station]) -> bool:
-    stations_by_ibnr: defaultdict[str, List[Station]] = defaultdict(list)
-    ok: bool = True
-
-    print(f"{Color.dim}Checking uniqueness of IBNR codes{Color.reset}")
-
-    for station in stations:
-        if station.ibnr is not None:
-            stations_by_ibnr[station.ibnr].append(station)
-
-    for invalid_group in filter(lambda stations: len(stations) > 1, stations_by_ibnr.values()):
-        if ok:
-            ok = False
-            print(f"{Color.on_prev_line}❌ {Color.red}Found duplicate IBNR codes:{Color.reset}")
+            for finding in findings:
+                for station in finding.stations:
+                    print_station(station, self.column)
+        else:
+            print(f"{Color.on_prev_line}✅ {Color.green}{self.success}{Color.reset}")
+
+
+class NearDuplicateRule(Rule):
+    """Finds pairs of stations closer than `max_distance` meters - usually the same station
+    imported twice under slightly different names.
+
+    Candidate pairs are found with a spatial grid (spatial.PointIndex), so that
+    the check takes O(n) time for evenly spread stations, instead of comparing every
+    pair of stations.
+    """
+    name = "near-duplicates"
+
+    def __init__(self, max_distance: float = NEAR_DUPLICATE_DISTANCE) -> None:
+        self.max_distance = max_distance
+
+    def grid(self, stations: List[AnyStation]) -> PointIndex[int]:
+        return PointIndex(range(len(stations)), lambda i: stations[i].position,
+                          cell_size=max(self.max_distance, 1.0))
+
+    def finding(self, station: AnyStation, other: AnyStation, distance: float) -> Finding:
+        return Finding(self.name, f"{station.id} {other.id}",
+                       (f"{Color.yellow}{distance:.2f} m{Color.reset} apart",), (station, other))
+
+    def check_index(self, index: StationIndex) -> Iterable[Finding]:
+        stations = index.stations
+        grid = self.grid(stations)
+        for idx, station in enumerate(stations):
+            for distance, other_idx in grid.within(station.position, self.max_distance):
+                if other_idx > idx:
+                    yield self.finding(station, stations[other_idx], distance)
+
+    def check_changes(self, index: StationIndex, changed: Set[str],
+                      findings: List[Finding]) -> Optional[Iterable[Finding]]:
+        stations = index.stations
+        positions = {station.id: idx for idx, station in enumerate(stations)}
+        pairs = {
+            (positions[station.id], positions[other.id])
+            for station, other in (i.stations for i in findings)
+            if station.id not in changed and other.id not in changed
+        }
+
+        grid = self.grid(stations)
+        for station_id in changed:
+            if (idx := positions.get(station_id)) is not None:
+                # Distances are re-calculated below from the first station of every pair,
+                # like in check_index - allow for differences in rounding
+                for _, other_idx in grid.within(stations[idx].position, self.max_distance + 1.0):
+                    if other_idx != idx:
+                        pairs.add((min(idx, other_idx), max(idx, other_idx)))
+
+        # Order the findings like check_index: by the first station, and then by distance
+        found = sorted(
+            (idx, distance(stations[idx].position, stations[other_idx].position), other_idx)
+            for idx, other_idx in pairs
+        )
+        return [self.finding(stations[idx], stations[other_idx], dist)
+                for idx, dist, other_idx in found if dist <= self.max_distance]
+
+    def describe(self, finding: Finding) -> str:
+        return " and ".join(i.name for i in finding.stations)
+
+    def report(self, findings: Sequence[Finding]) -> None:
+        print(f"{Color.dim}Checking for stations closer than {self.max_distance:g} m"
+              f"{Color.reset}")
+
+        if findings:
+            print(f"{Color.on_prev_line}❌ {Color.red}Found stations closer than "
+                  f"{self.max_distance:g} m:{Color.reset}")
             print("\t".join(FIELDS))
-
-        for station in invalid_group:
-            print_station(station, 2)
-
-    if ok:
-        print(f"{Color.on_prev_line}✅ {Color.green}IBNR codes are unique{Color.reset}")
-
-    return ok
-
-
-def verify_other_attributes(stations: List[Station]) -> bool:
-    ok: bool = True
-
-    print(f"{Color.dim}Checking optional attributes{Color.reset}")
-
-    for station in stations:
+            for finding in findings:
+                for station in finding.stations:
+                    print_station(station)
+                for issue in finding.issues:
+                    print("    " + issue)
+        else:
+            print(f"{Color.on_prev_line}✅ {Color.green}No stations are closer than "
+                  f"{self.max_distance:g} m{Color.reset}")
+
+
+class FuzzyNameRule(Rule):
+    """Finds pairs of stations with names differing only slightly - in case,
+    diacritics, punctuation (e.g. different dashes) or by a typo.
+
+    Names are compared with fuzzy.TrigramIndex, without comparing every pair of names.
+    Exactly equal names are left to the "uniq-names" rule.
+    """
+    name = "fuzzy-names"
+
+    def __init__(self, min_similarity: float = FUZZY_NAME_SIMILARITY) -> None:
+        self.min_similarity = min_similarity
+        self.name_trigrams: Dict[str, FrozenSet[str]] = {}
+        """Trigrams of names of the last checked stations - normalizing names takes
+        most of the time of building a TrigramIndex"""
+
+    def trigram_index(self, stations: List[AnyStation]) -> TrigramIndex:
+        known = self.name_trigrams
+        self.name_trigrams = {}
+        for station in stations:
+            if station.name not in self.name_trigrams:
+                grams = known.get(station.name)
+                self.name_trigrams[station.name] = grams if grams is not None \
+                    else name_trigrams(station.name)
+        return TrigramIndex((i.name for i in stations), self.name_trigrams.__getitem__)
+
+    def finding(self, station: AnyStation, other: AnyStation,
+                similarity: float) -> Optional[Finding]:
+        if station.name == other.name:
+            return None
+        return Finding(self.name, f"{station.id} {other.id}", (
+            f"similarity {Color.yellow}{similarity:.2f}{Color.reset} "
+            f"{Color.dim}({normalize_name(station.name)} / "
+            f"{normalize_name(other.name)}){Color.reset}",
+        ), (station, other))
+
+    def check_index(self, index: StationIndex) -> Iterable[Finding]:
+        stations = index.stations
+        names = self.trigram_index(stations)
+        for i, j, similarity in names.similar_pairs(self.min_similarity):
+            if (finding := self.finding(stations[i], stations[j], similarity)) is not None:
+                yield finding
+
+    def check_changes(self, index: StationIndex, changed: Set[str],
+                      findings: List[Finding]) -> Optional[Iterable[Finding]]:
+        stations = index.stations
+        positions = {station.id: idx for idx, station in enumerate(stations)}
+        pairs = {
+            (positions[station.id], positions[other.id])
+            for station, other in (i.stations for i in findings)
+            if station.id not in changed and other.id not in changed
+        }
+
+        names = self.trigram_index(stations)
+        for station_id in changed:
+            if (idx := positions.get(station_id)) is not None:
+                for other_idx, _ in names.similar_to(idx, self.min_similarity):
+                    pairs.add((min(idx, other_idx), max(idx, other_idx)))
+
+        found = (self.finding(stations[i], stations[j], dice(names.grams[i], names.grams[j]))
+                 for i, j in sorted(pairs))
+        return [i for i in found if i is not None]
+
+    def get_state(self) -> Any:
+        return self.name_trigrams
+
+    def set_state(self, state: Any) -> None:
+        self.name_trigrams = state
+
+    def describe(self, finding: Finding) -> str:
+        return " and ".join(i.name for i in finding.stations)
+
+    def report(self, findings: Sequence[Finding]) -> None:
+        print(f"{Color.dim}Checking for similar names{Color.reset}")
+
+        if findings:
+            print(f"{Color.on_prev_line}❌ {Color.red}Found similar names:{Color.reset}")
+            print("\t".join(FIELDS))
+            for finding in findings:
+                for station in finding.stations:
+                    print_station(station, 3)
+                for issue in finding.issues:
+                    print("    " + issue)
+        else:
+            print(f"{Color.on_prev_line}✅ {Color.green}No similar names found{Color.reset}")
+
+
+class IssuesRule(Rule):
+    """Base for rules reporting lists of issues with particular stations."""
+
+    def describe(self, finding: Finding) -> str:
+        if finding.stations:
+            return f"{finding.stations[0].pkpplk} ({finding.stations[0].name})"
+        return finding.subject
+
+    def report(self, findings: Sequence[Finding]) -> None:
+        print(f"{Color.dim}{self.title}{Color.reset}")
+
+        for finding in findings:
+            if finding.stations:
+                station = finding.stations[0]
+                print(f"Issues in {Color.blue}{station.pkpplk}{Color.reset} ({station.name}):")
+                for issue in finding.issues:
+                    print("    " + issue)
+            else:
+                for issue in finding.issues:
+                    print(issue)
+
+        if not findings:
+            print(f"{Color.on_prev_line}✅ {Color.green}{self.success}{Color.reset}")
+
+
+class StationAttributesRule(IssuesRule):
+    name = "station-attributes"
+    title = "Checking optional attributes"
+    success = "Optional attributes are OK"
+
+    def check_station(self, station: AnyStation) -> Iterable[Finding]:
         issues: List[str] = []
 
         wheelchair_value = station.other_tags.get("wheelchair")
@@ -143,32 +318,25 @@ def verify_other_attributes(stations: List[Station]) -> bool:
                           f"{Color.yellow}{ref_ztmw}{Color.reset}")
 
         if issues:
-            ok = False
-            print(f"Issues in {Color.blue}{station.pkpplk}{Color.reset} ({station.name}):")
-            for issue in issues:
-                print("    " + issue)
-
-    if ok:
-        print(f"{Color.on_prev_line}✅ {Color.green}Optional attributes are OK{Color.reset}")
-
-    return ok
+            yield Finding(self.name, station.id, tuple(issues), (station,))
 
 
-def verify_platforms(stations_map: Dict[str, Station], all_platforms: Dict[str, List[Platform]]) \
-        -> bool:
-    ok: bool = True
-    print(f"{Color.dim}Checking platforms{Color.reset}")
+class PlatformsRule(IssuesRule):
+    name = "platforms"
+    title = "Checking platforms"
+    success = "Platforms are OK"
 
-    for station_id, platforms in all_platforms.items():
+    def check_platforms(self, station_id: str, station: Optional[AnyStation],
+                        platforms: List[AnyPlatform]) -> Iterable[Finding]:
         issues: List[str] = []
 
         # Validate the reference
-        station = stations_map.get(station_id)
         if station is None:
-            ok = False
-            print(f"Invalid reference to station {Color.blue}{station_id}{Color.reset} "
-                  "from platforms:", ", ".join(sorted(i.id for i in platforms)))
-            continue
+            yield Finding(self.name, station_id, (
+                f"Invalid reference to station {Color.blue}{station_id}{Color.reset} "
+                "from platforms: " + ", ".join(sorted(i.id for i in platforms)),
+            ))
+            return
 
         # Validate unique names
         platforms_by_name = group_by(platforms, key=lambda i: i.name)
@@ -210,8 +378,8 @@ def verify_platforms(stations_map: Dict[str, Station], all_platforms: Dict[str,
         # Validate other attributes
         for platform in platforms:
             # Ensure the platform isn't too far away
-            distance_from_station = distance(platform.position, station.position)
-            if distance_from_station > 100.0 or math.isnan(distance_from_station):
+            if not is_within_distance(platform.position, station.position, 100.0, fast=True):
+                distance_from_station = distance(platform.position, station.position)
                 issues.append(
                         f"Platform {Color.blue}{platform.name}{Color.reset}: "
                         f"is {Color.yellow}{distance_from_station:.2f} m{Color.reset}"
@@ -238,29 +406,390 @@ def verify_platforms(stations_map: Dict[str, Station], all_platforms: Dict[str,
                         f"{Color.yellow}{wheelchair_value}{Color.reset}"
                     )
 
-        # Print the collected issues
         if issues:
-            ok = False
-            station = stations_map[station_id]
-            print(f"Issues in {Color.blue}{station.pkpplk}{Color.reset} ({station.name}):")
-            for issue in issues:
-                print("    " + issue)
-
-    if ok:
-        print(f"{Color.on_prev_line}✅ {Color.green}Platforms are OK{Color.reset}")
+            yield Finding(self.name, station_id, tuple(issues), (station,))
+
+
+class RailWay(NamedTuple):
+    """Summary of a railway=rail way, telling which ways have changed between runs."""
+    digest: bytes
+    """Hash of the way's nodes and their positions"""
+    bbox: Tuple[float, float, float, float]
+    """(min_lat, min_lon, max_lat, max_lon) of the way's nodes"""
+
+
+def rail_segments(data: OSMLoader) \
+        -> Tuple[List[Segment], Dict[str, RailWay], List[Tuple[str, int]]]:
+    """Returns all segments of railway=rail ways, summaries of the ways by their ids,
+    and (way id, node id) of nodes referenced by the ways, but missing from the data.
+
+    Ways are split at missing nodes - segments are only made of consecutive known nodes.
+    """
+    ways = [way for way in data.ways if way.tags.get("railway") == "rail" and way.nodes]
+    positions = data.nodes.positions_by_id(node for way in ways for node in way.nodes)
+
+    segments: List[Segment] = []
+    summaries: Dict[str, RailWay] = {}
+    missing: List[Tuple[str, int]] = []
+    for way in ways:
+        try:
+            way_positions = [positions[node] for node in way.nodes]
+            segments.extend(zip(way_positions, way_positions[1:]))
+        except KeyError:
+            way_positions = []
+            previous: Optional[Tuple[float, float]] = None
+            for node in way.nodes:
+                if (position := positions.get(node)) is None:
+                    missing.append((way.id, node))
+                else:
+                    if previous is not None:
+                        segments.append((previous, position))
+                    way_positions.append(position)
+                previous = position
+            if not way_positions:
+                continue
+
+        coordinates = array("d", chain.from_iterable(way_positions))
+        lats, lons = coordinates[::2], coordinates[1::2]
+        summaries[way.id] = RailWay(
+            hashlib.sha1(way.nodes.tobytes() + coordinates.tobytes()).digest(),
+            (min(lats), min(lons), max(lats), max(lons)),
+        )
+    return segments, summaries, missing
+
+
+def boxes_intersect(a: Tuple[float, float, float, float],
+                    b: Tuple[float, float, float, float]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class RailProximityRule(IssuesRule):
+    """Finds stations and platforms lying far away from any railway=rail way.
+
+    As rails are drawn only in parts of the map, only stations and platforms
+    between `max_distance` and `coverage` meters away from the nearest rail are reported.
+    Nearest rails are found with spatial.SegmentIndex over all segments of rail ways.
+    Nodes of rail ways missing from the file are reported too.
+    """
+    name = "rail-proximity"
+    title = "Checking distances to rails"
+    success = "Stations and platforms are close to rails"
+
+    def __init__(self, max_distance: float = RAIL_DISTANCE,
+                 coverage: float = RAIL_COVERAGE) -> None:
+        self.max_distance = max_distance
+        self.coverage = coverage
+        self.segments: List[Segment] = []
+        self.rail_ways: Dict[str, RailWay] = {}
+        self.missing_nodes: List[Tuple[str, int]] = []
+        self.platforms: List[AnyPlatform] = []
+        self.nearest_rails: Dict[Tuple[float, float], Optional[float]] = {}
+        """Distances to the nearest rail (within `coverage`) by position - re-used
+        between runs in the watch and incremental modes, except for positions
+        close to rails which have changed"""
+
+    def prepare(self, data: OSMLoader) -> None:
+        self.platforms = [platform for group in data.platforms.values() for platform in group]
+        self.segments, rail_ways, self.missing_nodes = rail_segments(data)
+
+        # Bounding boxes of all removed and added versions of ways
+        changed: List[Tuple[float, float, float, float]] = []
+        for way_id in self.rail_ways.keys() | rail_ways.keys():
+            old, new = self.rail_ways.get(way_id), rail_ways.get(way_id)
+            if old != new:
+                changed.extend(way.bbox for way in (old, new) if way is not None)
+
+        if changed:
+            self.nearest_rails = {
+                position: distance
+                for position, distance in self.nearest_rails.items()
+                if not self.may_have_changed(position, distance, changed)
+            }
+        self.rail_ways = rail_ways
+
+    def may_have_changed(self, position: Tuple[float, float], distance: Optional[float],
+                         changed: List[Tuple[float, float, float, float]]) -> bool:
+        """Checks whether the distance to the nearest rail may be different after rails
+        in the `changed` bounding boxes were added or removed - only if any of them is
+        closer than the nearest rail (or `coverage`, if there's none)."""
+        radius = distance if distance is not None else self.coverage
+        # 1 m of slack for differences between segment_distance and the spherical bounding box
+        search_box = bounding_box(position, radius + 1.0)
+        return search_box is None or any(boxes_intersect(search_box, i) for i in changed)
+
+    def find_nearest_rails(self, positions: List[Tuple[float, float]]) -> None:
+        """Adds the distances to the nearest rail of the positions to `nearest_rails`.
+
+        If distances of other positions are already known (e.g. only a few stations
+        have changed), only rails which may be within `coverage` of the new positions
+        are indexed - the rest can't be found by the searches anyway.
+        """
+        segments = self.segments
+        boxes = [bounding_box(i, self.coverage) for i in positions] if self.nearest_rails else []
+        known_boxes = [box for box in boxes if box is not None]
+        if boxes and len(known_boxes) == len(boxes):
+            min_lats, min_lons, max_lats, max_lons = zip(*known_boxes)
+            min_lat, min_lon = min(min_lats), min(min_lons)
+            max_lat, max_lon = max(max_lats), max(max_lons)
+            segments = [
+                ((lat1, lon1), (lat2, lon2))
+                for (lat1, lon1), (lat2, lon2) in segments
+                if (lat1 >= min_lat or lat2 >= min_lat) and (lat1 <= max_lat or lat2 <= max_lat)
+                and (lon1 >= min_lon or lon2 >= min_lon) and (lon1 <= max_lon or lon2 <= max_lon)
+            ]
+
+        rails = SegmentIndex(segments)
+        for position in positions:
+            # Most positions are close to rails, which is decided with a search
+            # in a much smaller area than `coverage`
+            nearest = rails.nearest(position, self.max_distance)
+            if nearest is None:
+                nearest = rails.nearest(position, self.coverage)
+            self.nearest_rails[position] = nearest[0] if nearest is not None else None
+
+    def distance_to_rail(self, position: Tuple[float, float]) -> Optional[float]:
+        """Returns the distance to the nearest rail, if it's an outlier; otherwise None."""
+        distance = self.nearest_rails[position]
+        return distance if distance is not None and distance > self.max_distance else None
+
+    def get_state(self) -> Any:
+        return self.rail_ways, self.nearest_rails
+
+    def set_state(self, state: Any) -> None:
+        self.rail_ways, self.nearest_rails = state
+
+    def check_index(self, index: StationIndex) -> Iterable[Finding]:
+        for way_id, node_id in self.missing_nodes:
+            yield Finding(self.name, f"{way_id} {node_id}", (
+                f"Rail way {Color.blue}{way_id}{Color.reset} references missing node "
+                f"{Color.yellow}{node_id}{Color.reset}",
+            ))
+        if not self.segments:
+            return
+
+        positions = [i.position for i in chain(index.stations, self.platforms)]
+        if missing := list(dict.fromkeys(i for i in positions if i not in self.nearest_rails)):
+            self.find_nearest_rails(missing)
+        # Forget positions of removed or moved stations and platforms
+        self.nearest_rails = {i: self.nearest_rails[i] for i in positions}
+
+        # Issues are grouped by stations, including issues with their platforms
+        issues: Dict[str, List[str]] = {}
+        stations: Dict[str, AnyStation] = {}
+        unknown_station_findings: List[Finding] = []
+
+        for station in index.stations:
+            if (distance := self.distance_to_rail(station.position)) is not None:
+                stations[station.id] = station
+                issues.setdefault(station.id, []).append(
+                    f"Station is {Color.yellow}{distance:.2f} m{Color.reset} "
+                    "away from the nearest rail"
+                )
+
+        for platform in self.platforms:
+            if (distance := self.distance_to_rail(platform.position)) is not None:
+                platform_station = index.get("ref", platform.station)
+                label = platform.name if platform_station is not None \
+                    else f"{platform.id} (of unknown station {platform.station})"
+                issue = f"Platform {Color.blue}{label}{Color.reset}: is " \
+                    f"{Color.yellow}{distance:.2f} m{Color.reset} away from the nearest rail"
+
+                if platform_station is not None:
+                    stations[platform_station.id] = platform_station
+                    issues.setdefault(platform_station.id, []).append(issue)
+                else:
+                    unknown_station_findings.append(Finding(self.name, platform.id, (issue,)))
+
+        for station_id, station_issues in issues.items():
+            yield Finding(self.name, station_id, tuple(station_issues), (stations[station_id],))
+        yield from unknown_station_findings
+
+
+RULES: List[Rule] = [
+    UniquenessRule("uniq-pkpplk", "ref", 1, "Checking uniqueness of PKP PLK IDs",
+                   "Found duplicate PKP PLK ids:", "PKP PLK ids are unique"),
+    UniquenessRule("uniq-names", "name", 3, "Checking uniqueness of names",
+                   "Found duplicate names:", "Station names are unique"),
+    UniquenessRule("uniq-ibnr", "ref:ibnr", 2, "Checking uniqueness of IBNR codes",
+                   "Found duplicate IBNR codes:", "IBNR codes are unique"),
+    FuzzyNameRule(),
+    NearDuplicateRule(),
+    StationAttributesRule(),
+    PlatformsRule(),
+    RailProximityRule(),
+]
+"""All rules checked by this script, in the order of reporting.
+New rules only need to be added here - run_rules makes a single pass over the data
+for all of them."""
+
+
+def report(rules: Sequence[Rule], findings: Mapping[str, Sequence[Finding]]) -> bool:
+    """Prints findings of all rules. Returns True if there were no findings."""
+    for rule in rules:
+        rule.report(findings[rule.name])
+    return not any(findings[rule.name] for rule in rules)
+
+
+def report_changes(rules: Sequence[Rule], old: Mapping[str, Sequence[Finding]],
+                   new: Mapping[str, Sequence[Finding]]) -> bool:
+    """Prints findings which have appeared or disappeared between 2 runs of the rules.
+    Returns True if anything was printed."""
+    changed = False
+    for rule in rules:
+        added = [i for i in new[rule.name] if i not in old[rule.name]]
+        resolved = [i for i in old[rule.name] if i not in new[rule.name]]
+        if added:
+            rule.report(added)
+        for finding in resolved:
+            print(f"✅ {Color.green}Resolved{Color.reset} {Color.dim}({rule.name}){Color.reset}: "
+                  f"{rule.describe(finding)}")
+        changed = changed or bool(added or resolved)
+    return changed
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def watch(rules: Sequence[Rule], path: str, data: OSMLoader, reload: Callable[[], OSMLoader],
+          interval: float = WATCH_INTERVAL) -> bool:
+    """Reports all findings, and then keeps checking the file for changes (until interrupted
+    with Ctrl+C), re-printing only the findings which have changed.
+
+    The data and the results of the rules are kept in memory, and only changed stations
+    and platform groups are re-checked (see incremental.update_snapshot).
+    Returns True if there were no findings in the last successful check.
+    """
+    stamp = file_stamp(path)
+    pending = stamp
+
+    prepare_rules(rules, data)
+    first_snapshot = full_snapshot(rules, data.stations, data.platforms)
+    findings = first_snapshot.findings(rules)
+    snapshot: Optional[Snapshot] = first_snapshot
+    ok = report(rules, findings)
+
+    try:
+        while True:
+            time.sleep(interval)
+
+            # Wait until the file stops changing - editors may write it in several steps
+            current = file_stamp(path)
+            if current is None or current == stamp:
+                continue
+            elif current != pending:
+                pending = current
+                continue
+            stamp = current
+
+            started = time.perf_counter()
+            try:
+                data = reload()
+                prepare_rules(rules, data)
+                # update_snapshot modifies the base snapshot in place - if it fails,
+                # the next check starts from scratch
+                base, snapshot = snapshot, None
+                snapshot = (update_snapshot(rules, base, data.stations, data.platforms)
+                            if base is not None else None) \
+                    or full_snapshot(rules, data.stations, data.platforms)
+                new_findings = snapshot.findings(rules)
+            except Exception as e:
+                # The previous findings are kept, to report changes against them later
+                print(f"❌ {Color.red}Failed to check {path}:{Color.reset} {e!r}")
+                continue
+            elapsed = time.perf_counter() - started
+
+            print(f"{Color.dim}[{time.strftime('%H:%M:%S')}] {path} changed, "
+                  f"checked in {elapsed * 1000:.0f} ms{Color.reset}")
+            if not report_changes(rules, findings, new_findings):
+                print(f"{Color.dim}No changes in findings{Color.reset}")
+            findings = new_findings
+            ok = not any(findings.values())
+    except KeyboardInterrupt:
+        pass
 
     return ok
 
 
 if __name__ == "__main__":
-    data = OSMLoader.load_all("plrailmap.osm")
-    ok = True
-    ok = verify_uniq_pkpplk(data.stations) and ok
-    ok = verify_uniq_names(data.stations) and ok
-    ok = verify_uniq_ibnr(data.stations) and ok
-    ok = verify_other_attributes(data.stations) and ok
-
-    stations_map: Dict[str, Station] = {i.pkpplk: i for i in data.stations}
-
-    ok = verify_platforms(stations_map, data.platforms) and ok
+    argument_parser = ArgumentParser()
+    argument_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes running the rules (output is the same regardless)",
+    )
+    argument_parser.add_argument(
+        "-i",
+        "--incremental",
+        nargs="?",
+        const="HEAD",
+        metavar="REVISION",
+        help="only re-check what has changed since a git revision (HEAD by default); "
+             "fast enough to be used as a pre-commit hook",
+    )
+    argument_parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="keep running and re-check the file whenever it's saved, "
+             "printing only the changed findings",
+    )
+    argument_parser.add_argument(
+        "--fuzzy-name-similarity",
+        type=float,
+        default=FUZZY_NAME_SIMILARITY,
+        metavar="SIMILARITY",
+        help="report station names at least this similar, greater than 0 and at most 1 "
+             f"(default: {FUZZY_NAME_SIMILARITY:g})",
+    )
+    argument_parser.add_argument(
+        "--rail-distance",
+        type=float,
+        default=RAIL_DISTANCE,
+        metavar="METERS",
+        help="report stations and platforms further than this from the nearest rail "
+             f"(default: {RAIL_DISTANCE:g} m)",
+    )
+    argument_parser.add_argument(
+        "--near-duplicate-distance",
+        type=float,
+        default=NEAR_DUPLICATE_DISTANCE,
+        metavar="METERS",
+        help=f"report stations closer than this (default: {NEAR_DUPLICATE_DISTANCE:g} m)",
+    )
+    add_loader_arguments(argument_parser)
+    args = argument_parser.parse_args()
+    if not 0 < args.fuzzy_name_similarity <= 1:
+        argument_parser.error("--fuzzy-name-similarity must be greater than 0 and at most 1")
+
+    for rule in RULES:
+        if isinstance(rule, FuzzyNameRule):
+            rule.min_similarity = args.fuzzy_name_similarity
+        elif isinstance(rule, NearDuplicateRule):
+            rule.max_distance = args.near_duplicate_distance
+        elif isinstance(rule, RailProximityRule):
+            rule.max_distance = args.rail_distance
+
+    if args.incremental is not None:
+        # The file is loaded only if there are no findings for its contents yet
+        findings = run_rules_incrementally(RULES, "plrailmap.osm", args.incremental,
+                                           lambda: load_from_args(args))
+        ok = report(RULES, findings)
+        sys.exit(0 if ok else 1)
+
+    data = load_from_args(args)
+    if args.watch:
+        ok = watch(RULES, "plrailmap.osm", data, lambda: OSMLoader.load_all(
+            "plrailmap.osm", use_cache=False, backend=args.backend, jobs=args.parse_jobs))
+        sys.exit(0 if ok else 1)
+
+    prepare_rules(RULES, data)
+    findings = run_rules_in_parallel(RULES, data.stations, data.platforms, args.jobs)
+    ok = report(RULES, findings)
     sys.exit(0 if ok else 1)